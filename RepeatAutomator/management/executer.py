@@ -5,14 +5,21 @@ import sys, os
 sys.path.append("{0}/Desktop/cbmi/reproduce/python/MedicalResearchTool/objects".format(os.environ['HOME'])) #TODO
 sys.path.append("{0}/Desktop/cbmi/reproduce/python/MedicalResearchTool".format(os.environ['HOME']))
 from getopt import getopt
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from collections import OrderedDict, deque
+from glob import iglob
 
 #objects
-from Article import XMLArticle, PDFArticle
+from Article import XMLArticle, PDFArticle, RawArticle
 from ArticleManager import ArticleManager
 from Trainer import Trainer
+from ModelArtifact import ModelArtifact
 from DatabaseManager import DatabaseManager
 from ArticleExtractor import ArticleExtractor
 from XMLExtractor import XMLExtractor
+from PubmedFetcher import PubmedFetcher
+from PubmedCache import PubmedCache
 
 from pprint import pprint
 import re
@@ -24,7 +31,7 @@ Handle article extraction using:
 	XMLArticle / PDFArticle
 	ArticleExtractor
 	XMLExtractor
-	Trainer
+	Trainer / ModelArtifact
 Depends on imported methods:
 	os				-- https://docs.python.org/3/library/os.html
 	sys				-- https://docs.python.org/3/library/sys.html
@@ -39,12 +46,31 @@ Command line arguments:
 	--by-itself, -b 				-- tell extractors not to request user interaction
 	--directory, -d					-- directory where pdf files are located
 	--file=, -f						-- provide file with list of articles to be extracted separated by any character except: letter, number, period (.), forward slash (/), hyphen (-), underscore (_)
+										(- reads the list from standard input; the list is read as extraction goes, so extraction starts before the whole list is read)
+	--glob=							-- extract every article whose pdf in --directory matches this pattern (ex: '*.pdf')
 	--identifier=, -i				-- what identifier is used (doi, pmid, pmc, publisher-id)
 	--xml, -x						-- perform xml extraction
 	--text, -t						-- perform text extraction
 	--redcap, -r 					-- enter extracted data into redcap database
-	--machine-learning=, -m			-- run machine-learning trainer on given redcap field
+	--machine-learning=, -m			-- run machine-learning trainer on given redcap field(s), separated by commas; reports k-fold cross-validation accuracy, precision/recall and confusion matrix of each field
+										(with --workers, folds are evaluated on that many processes)
+	--folds=						-- with --machine-learning, number of cross-validation folds (default 10)
+	--models=						-- with --machine-learning, directory to save each field's trained model in ({field}.json, see ModelArtifact)
+										otherwise, directory of trained models to classify articles with during --text extraction
 	--zxml=, -z						-- run extraction on the provided xml file from pubmed central
+										(the first run on a file saves an offset index next to it, {file}.idx, so later runs only read the requested articles)
+	--workers=						-- number of processes to extract articles with (default 1, implies --by-itself when greater than 1)
+	--redcap-chunk=					-- with --redcap, upload entries in multi-record imports of this many records instead of one request per article
+										(each article gets a record of its own, numbered by redcap, instead of the placeholder record, see queue_redcap)
+	--metadata-snapshot=			-- json file to keep a copy of the redcap metadata in, refreshed from redcap once a day
+	--data-dictionary=				-- load the redcap metadata from a data dictionary csv (DataDictionary/*.csv) instead of redcap
+	--no-text-cache					-- always run textract on pdfs instead of reusing text cached by earlier runs (see TextCache)
+	--fetch-threads=				-- with --xml, number of pubmed efetch requests (of up to 200 articles each) to run at once (default 4, see PubmedFetcher)
+	--xml-cache=					-- directory to cache downloaded pubmed xml in (default ~/.cache/RepeatAutomator/pubmed, see PubmedCache)
+	--xml-cache-ttl=				-- download cached pubmed xml again once it is this many days old (default never)
+	--no-xml-cache					-- always download pubmed xml instead of reusing xml cached by earlier runs
+	--offline						-- only use cached pubmed xml, never download
+	--xml-backend=					-- how --xml extraction parses pubmed xml: 'soup' (BeautifulSoup, default) or 'lxml' (faster, same results, see XMLExtractor.xml_extract_lxml)
 (I ran out of letters)
 
 As it's set up now, articles much be saved as: {identifier}.pdf
@@ -68,6 +94,30 @@ christian$ ./executer -f /Users/christian/Desktop/cbmi/reproduce/python/articles
 #the articles in: /Users/christian/Desktop/cbmi/reproduce/python/articles/articlefile.txt are pmids
 #dont ask for user interaction
 
+christian$ ./executer -f /Users/christian/Desktop/cbmi/reproduce/python/articles/articlefile.txt -d /Users/christian/Desktop/cbmi/reproduce/python/articles -i pmid -t --workers=8
+#same as above but extract eight articles at a time, each in its own process
+#results are printed in the order the articles were listed
+
+christian$ some_upstream_job | ./executer -f - -d /Users/christian/Desktop/cbmi/reproduce/python/articles -i pmid -t --workers=8
+#extract the articles whose pmids some_upstream_job prints, starting with the first pmid it prints
+
+christian$ ./executer --glob='*.pdf' -d /Users/christian/Desktop/cbmi/reproduce/python/articles -i pmid -tb
+#extract every pdf in the folder (each named {pmid}.pdf)
+
+christian$ ./executer -f /Users/christian/Desktop/cbmi/reproduce/python/articles/articlefile.txt -d /Users/christian/Desktop/cbmi/reproduce/python/articles -i pmid -xb --offline
+#rerun xml extraction using only the pubmed xml cached by earlier runs (no network requests)
+#cache hits and misses are printed at the end of the run
+
+christian$ ./executer -f /Users/christian/Desktop/cbmi/reproduce/python/articles/articlefile.txt -d /Users/christian/Desktop/cbmi/reproduce/python/articles -m analysis_processes_clear,data_cleaned_yn --folds=10 --workers=4
+#train a classifier for each of the redcap fields: analysis_processes_clear and data_cleaned_yn
+#and report its 10-fold cross-validation accuracy, precision/recall and confusion matrix, evaluating four folds at a time
+
+christian$ ./executer -f /Users/christian/Desktop/cbmi/reproduce/python/articles/articlefile.txt -d /Users/christian/Desktop/cbmi/reproduce/python/articles -m analysis_processes_clear --models=/Users/christian/Desktop/cbmi/reproduce/python/models
+#train a classifier for analysis_processes_clear and save it in: /Users/christian/Desktop/cbmi/reproduce/python/models/analysis_processes_clear.json
+
+christian$ ./executer -f /Users/christian/Desktop/cbmi/reproduce/python/articles/articlefile.txt -d /Users/christian/Desktop/cbmi/reproduce/python/articles -i pmid -tb --models=/Users/christian/Desktop/cbmi/reproduce/python/models
+#text extraction, also extracting analysis_processes_clear with the saved classifier (no retraining)
+
 christian$ cat /Users/christian/Desktop/cbmi/reproduce/python/articles/articlefile.txt | head -n 8
 24433938
 26513432
@@ -89,27 +139,38 @@ christian$ ./executer -a 10.1186/s12884-015-0587-z,10.1186/s12947-015-0023-6,10.
 """
 
 
-ncbi_site = "https://www.ncbi.nlm.nih.gov/"
-xml_tag = "?report=xml&format=text"
-
 opts = dict()
+metadata = []
+xml_cache = None 	#PubmedCache shared by every prefetch of the run
+pending = []		#entries waiting to be uploaded to redcap in bulk (--redcap-chunk)
+placeholder_record = '9b7057f5f8894c9c'		#TODO, new redcap entry id: every entry is entered into this dummy record for now, unless uploaded in bulk (--redcap-chunk)
+models = {}			#{redcap field: ModelArtifact} loaded from --models, see text_extract
+model_extractors = {'analysis_processes_clear':'get_analysis'}		#{redcap field: PDFArticle / XMLArticle method that takes the field's classifier}
+seen_size = 1000000	#most recent article ids remembered to skip repeats, see unique
 
 def get_command_args(argv):
 
-	articles = []
+	sources = []		#('articles', list of ids) / ('file', path) / ('glob', pattern), in the order they were given
 
 	identifier = "pmid"
 	indi = xml = text = redcap = directory = ml = zxml = 0
-	opts, args = getopt(argv,"a:bd:f:i:xprtm:z:",["articles=","by-itself","directory=","file=","identifier=","xml","pdf","redcap","text","--machine-learning=","zxml="])
+	workers = text_cache = 1
+	fetch_threads = 4
+	xml_cache = ''
+	xml_cache_ttl = offline = 0
+	xml_backend = 'soup'
+	folds = 10
+	model_dir = ''
+	chunk = 0
+	snapshot = dictionary = ''
+	opts, args = getopt(argv,"a:bd:f:i:xprtm:z:",["articles=","by-itself","directory=","file=","identifier=","xml","pdf","redcap","text","machine-learning=","zxml=","workers=","no-text-cache","redcap-chunk=","metadata-snapshot=","data-dictionary=","fetch-threads=","xml-cache=","xml-cache-ttl=","no-xml-cache","offline","xml-backend=","folds=","models=","glob="])
 	for opt,arg in opts:
 		if opt in ("-a","--articles"):
-			articles.extend(arg.split(','))
+			sources.append(('articles',arg.split(',')))
 		elif opt in ("-b","--by-itself"):
 			indi = 1
 		elif opt in ("-f","--file"):
-			with open(arg,'rb') as f:
-				file_text = f.read().decode()
-				articles.extend(re.sub(r'[^\w/\.\-\_]+',' ',file_text).split())
+			sources.append(('file',arg))
 		elif opt in ("-i","--identifier"):
 			identifier = arg
 		elif opt in ("-x","--xml"):
@@ -124,6 +185,40 @@ def get_command_args(argv):
 			ml = arg
 		elif opt in ("-z","--zxml"):
 			zxml = arg
+		elif opt == "--workers":
+			workers = int(arg)
+		elif opt == "--no-text-cache":
+			text_cache = 0
+		elif opt == "--redcap-chunk":
+			chunk = int(arg)
+		elif opt == "--metadata-snapshot":
+			snapshot = arg
+		elif opt == "--data-dictionary":
+			dictionary = arg
+		elif opt == "--fetch-threads":
+			fetch_threads = int(arg)
+		elif opt == "--xml-cache":
+			xml_cache = arg
+		elif opt == "--xml-cache-ttl":
+			xml_cache_ttl = float(arg) * 24 * 60 * 60
+		elif opt == "--no-xml-cache":
+			xml_cache = None
+		elif opt == "--offline":
+			offline = 1
+		elif opt == "--xml-backend":
+			if (arg not in ('soup','lxml')):
+				raise ValueError("--xml-backend must be 'soup' or 'lxml', not: '{}'".format(arg))
+			xml_backend = arg
+		elif opt == "--folds":
+			folds = int(arg)
+		elif opt == "--models":
+			model_dir = arg
+		elif opt == "--glob":
+			sources.append(('glob',arg))
+	if (workers > 1 and not indi and not ml):
+		#worker processes cant prompt the user, so batch mode always runs by itself
+		print("--workers={} requested, running --by-itself".format(workers))
+		indi = 1
 	return ({
 		'indi':indi,
 		'ident':identifier,
@@ -132,43 +227,126 @@ def get_command_args(argv):
 		'redcap':redcap,
 		'dir':directory,
 		'ml':ml,
-		'zxml':zxml
-		}, articles)
+		'zxml':zxml,
+		'workers':workers,
+		'text_cache':text_cache,
+		'chunk':chunk,
+		'snapshot':snapshot,
+		'dictionary':dictionary,
+		'fetch_threads':fetch_threads,
+		'xml_cache':xml_cache,
+		'xml_cache_ttl':xml_cache_ttl,
+		'offline':offline,
+		'xml_backend':xml_backend,
+		'folds':folds,
+		'models':model_dir
+		}, unique(read_articles(sources,directory)))
+
+def read_articles(sources,directory):
+	"""
+	Read article ids lazily, so extraction starts with the first id instead of after the last
+	Args:
+		sources 	-- where to read ids from, in order (list of tuples, see get_command_args)
+		directory 	-- where the pdfs are, for ('glob', pattern) sources (string)
+	Return: generator of article ids (strings), repeats included
+	"""
+	for (kind,source) in sources:
+		if (kind == 'articles'):
+			yield from source
+		elif (kind == 'glob'):
+			for path in iglob(os.path.join(directory or '.',source)):
+				yield os.path.splitext(os.path.basename(path))[0]
+		elif (source == '-'):
+			yield from read_ids(sys.stdin,size=0)
+		else:
+			with open(source,'r',encoding='utf-8') as f:
+				yield from read_ids(f)
+
+def read_ids(f,size=1 << 16):
+	"""
+	Args: f -- open text file of ids separated by any character except: letter, number, period (.), forward slash (/), hyphen (-), underscore (_)
+	KeywordArgs: size -- characters to read at a time (int), 0 to read a line at a time (so ids piped in are extracted as soon as their line is written)
+	Return: generator of ids (strings), yielded as soon as they are read
+	"""
+	rest = ''
+	while True:
+		block = f.read(size) if size else f.readline()
+		text = rest + block
+		ids = re.findall(r'[\w/\.\-]+',text)
+		rest = ids.pop() if (block and ids and text.endswith(ids[-1])) else ''		#the last id may go on in the next block
+		yield from ids
+		if (not block):
+			return
+
+def unique(articles):
+	"""
+	Drop repeated article ids, keeping the order of their first appearance
+	Only the {seen_size} most recently seen ids are remembered, so memory stays bounded however many ids are streamed in
+	Args: articles -- article ids (iterable of strings)
+	Return: generator of article ids
+	"""
+	seen = OrderedDict()
+	for each_article in articles:
+		if (each_article in seen):
+			seen.move_to_end(each_article)
+			continue
+		seen[each_article] = None
+		if (len(seen) > seen_size):
+			seen.popitem(last=False)
+		yield each_article
 
 def train(articles):
 	global opts
-	for field in opts['ml'].split(','):
-		tr = Trainer(field.strip(),opts['dir'],articles)
+	#one Trainer for every field: the articles are extracted, tokenized and pulled from redcap once
+	tr = Trainer([field.strip() for field in opts['ml'].split(',')],opts['dir'],articles,folds=opts['folds'],workers=opts['workers'],models=opts['models'])
 
 
-def extract(article):
-	global opts
+@contextmanager
+def article_context(article):
+	"""
+	Expose the article being extracted to DatabaseManager.record_error
+	record_error reads article_id and identifier from the environment when they arent passed explicitly
+	Each worker process of a batch run has its own copy of os.environ, so articles extracted in parallel never see each others ids
+	"""
 	os.environ['article_id'] = str(article.article_id)
 	os.environ['identifier'] = str(article.identifier)
+	try:
+		yield article
+	finally:
+		del os.environ['article_id']
+		del os.environ['identifier']
 
-	if (opts['xml']):
-		xml_extract(article)
-
-
-	if (opts['text']):
-		text_extract(article)
-
-	article.entry = article.clean_entry()
-	pprint(article.entry)
-
-	if (opts['redcap']):
-		#TODO, new redcap entry id
-		article.enter_redcap(article.entry,'9b7057f5f8894c9c')
-		print(str(article.redcap_return))
-
-
-	del os.environ['article_id']
-	del os.environ['identifier']
-
-	print("\n\n\n\n")
-	return
-
-def xml_extract(article):
+def extract(article,report=True,pubmed=None):
+	global opts
+	with article_context(article):
+		if (opts['xml']):
+			xml_extract(article,pubmed)
+
+
+		if (opts['text']):
+			text_extract(article)
+
+		article.entry = article.clean_entry()
+		if (opts['redcap'] and opts['chunk'] and article.entry):
+			article.entry['record_id'] = str(article.article_id)		#provisional record name, redcap numbers the record on import (see queue_redcap)
+		if (report):
+			pprint(article.entry)
+
+		if (opts['redcap'] and not opts['chunk']):
+			article.enter_redcap(article.entry,placeholder_record)
+			if (report):
+				print(str(article.redcap_return))
+
+	if (report):
+		print("\n\n\n\n")
+	return article.entry
+
+def xml_extract(article,pubmed=None):
+	"""
+	Args:
+		article -- PDFArticle or XMLArticle being extracted
+		pubmed 	-- the article's pubmed xml if it was already downloaded (see prefetch), otherwise it is downloaded here
+	"""
 	xe = XMLExtractor()
 	if (article.identifier == 'pubmed' or article.identifier == 'pmid'):
 		pmid = article.article_id
@@ -180,8 +358,11 @@ def xml_extract(article):
 			print("couldnt perform xml extract for article: '{}' because no pubmed code provided".format(article.identifier))
 			return
 
-	xml = xe.xml_load("{0}pubmed/{1}{2}".format(ncbi_site,pmid,xml_tag))
-	article.entry.update(xe.xml_extract(xml))
+	site = PubmedFetcher.site.format(pmid)
+	if (opts['xml_backend'] == 'lxml'):
+		article.entry.update(xe.xml_extract_lxml(xe.xml_download(site) if pubmed is None else pubmed,site))
+	else:
+		article.entry.update(xe.xml_extract(xe.xml_load(site,pubmed)))
 	try:
 		article.get_institution(xe.institution)
 		article.get_clinical_domain_from_xml(xe.institution)
@@ -201,34 +382,197 @@ def text_extract(art):
 	art.get_nlp()
 	art.get_limitations()
 	art.get_stats()
-
+	for (field,method) in model_extractors.items():
+		getattr(art,method)(models.get(field))		#skips the field when no model was loaded for it
+
+
+def prefetch(items,pmid):
+	"""
+	Download the pubmed xml of articles ahead of extracting them, enough at a time to keep every --fetch-threads request busy (see PubmedFetcher)
+	Args:
+		items 	-- articles to be extracted (iterable)
+		pmid 	-- function that returns the pmid of an item ('' if it has none)
+	Return: generator of (item, pubmed xml) tuples, in the order of items
+		pubmed xml is None when --xml wasnt requested or the item has no pmid (xml_extract handles it as before)
+	"""
+	if (not opts['xml']):
+		for item in items:
+			yield (item,None)
+		return
+	fetcher = PubmedFetcher(workers=opts['fetch_threads'],cache=xml_cache)
+	size = fetcher.batch_size * fetcher.workers
+	chunk = []
+	for item in items:
+		chunk.append(item)
+		if (len(chunk) == size):
+			yield from prefetched(fetcher,chunk,pmid)
+			chunk = []
+	yield from prefetched(fetcher,chunk,pmid)
+	fetcher.close()
+
+def prefetched(fetcher,chunk,pmid):
+	pmids = [pmid(item) for item in chunk]
+	xml = fetcher.fetch_all(set(filter(None,pmids)))
+	for (item,each_pmid) in zip(chunk,pmids):
+		yield (item,xml.get(each_pmid))
+
+def article_pmid(article_id):
+	return article_id if (opts['ident'] in ('pmid','pubmed')) else ''
+
+def queue_redcap(entry):
+	"""
+	Hold an extracted entry for bulk upload to redcap, uploading once {opts['chunk']} entries are waiting
+	Each entry is a new redcap record: its 'record_id' is the article id (set by extract), which only keeps the article's fields together
+	and names the article in failed imports; redcap replaces it with the next record id when the records are imported (see flush_redcap)
+	Args: entry -- cleaned redcap entry of an article (dictionary), entries with nothing extracted (no 'record_id') are skipped
+	"""
+	if (not (opts['redcap'] and opts['chunk']) or entry is None or 'record_id' not in entry):
+		return
+	pending.append(entry)
+	if (len(pending) >= opts['chunk']):
+		flush_redcap()
+
+def flush_redcap():
+	"""
+	Upload every entry waiting in pending to redcap as new, auto-numbered records (see ArticleManager.enter_redcap_bulk)
+	"""
+	if (not pending):
+		return
+	print(str(ArticleManager(metadata=metadata,run_style=1).enter_redcap_bulk(pending,chunk_size=opts['chunk'],auto_number=True)))
+	del pending[:]
+
+def load_models():
+	"""
+	Load the models in --models that extraction has a method for (see model_extractors)
+	Warns about models trained against another version of the data dictionary than {metadata}, and models extraction cant use
+	Return: dictionary of format: {redcap field: ModelArtifact}
+	"""
+	loaded = ModelArtifact.load_all(opts['models'],metadata)
+	for field in loaded:
+		if (field not in model_extractors):
+			print("model for: '{}' isnt used, extraction has no method for it (see model_extractors)".format(field))
+	return dict((field,model) for (field,model) in loaded.items() if field in model_extractors)
+
+def init_worker(worker_opts,worker_metadata):
+	"""
+	Set up a batch worker process: every worker owns its own copy of the options and metadata,
+	and builds a fresh ArticleExtractor (PDFArticle / XMLArticle) for every article it extracts
+	"""
+	global opts, metadata, models
+	opts = worker_opts
+	metadata = DatabaseManager().set_metadata(worker_metadata)
+	if (opts['models']):
+		models = load_models()
+	if (not opts['text_cache']):
+		RawArticle.text_cache = None
+	#dont let ids from the parent process leak into errors recorded by the worker
+	os.environ.pop('article_id',None)
+	os.environ.pop('identifier',None)
+
+def extract_worker(job):
+	"""
+	Extract a single article inside a worker process
+	Args: job -- (article_id, xml text, pubmed xml) tuple; xml text is None for pdf articles, pubmed xml is None if it wasnt prefetched
+	Return: (article_id, entry, redcap_return) tuple, entry is None if the article wasnt found
+	"""
+	(each_article,xmltext,pubmed) = job
+	try:
+		if (xmltext is None):
+			art = PDFArticle("{}/{}".format(opts['dir'],each_article),each_article,opts['ident'],run_style=opts['indi'],metadata=metadata)
+		else:
+			art = XMLArticle(each_article,opts['ident'],run_style=opts['indi'],metadata=metadata,xmltext=xmltext)
+		entry = extract(art,report=False,pubmed=pubmed)
+		return (each_article,entry,getattr(art,'redcap_return',None))
+	except TypeError as e:
+		return (each_article,None,None)
+
+def extract_batch(jobs):
+	"""
+	Fan article extraction out across a pool of {opts['workers']} processes
+	Args: jobs -- iterable of (article_id, xml text, pubmed xml) tuples (see extract_worker)
+	Results are reported in the same order the jobs were given
+	Jobs are submitted as results are reported, at most four per worker ahead, so a long stream of jobs is never read (or held in memory) all at once
+	"""
+	with ProcessPoolExecutor(max_workers=opts['workers'],initializer=init_worker,initargs=(opts,metadata)) as pool:
+		for (each_article,entry,redcap_return) in bounded_map(pool,extract_worker,jobs,4 * opts['workers']):
+			if (entry is None):
+				print("{} not found".format(each_article))
+				continue
+			pprint(entry)
+			if (redcap_return is not None):
+				print(str(redcap_return))
+			print("\n\n\n\n")
+			queue_redcap(entry)
+
+def bounded_map(pool,fn,jobs,window):
+	"""
+	Same as pool.map(fn,jobs), but with at most {window} jobs submitted and not yet returned (pool.map submits every job up front)
+	Return: generator of results, in the order of jobs
+	"""
+	futures = deque()
+	for job in jobs:
+		futures.append(pool.submit(fn,job))
+		if (len(futures) >= window):
+			yield futures.popleft().result()
+	while (futures):
+		yield futures.popleft().result()
+
+def report_cache():
+	if (xml_cache is not None and opts['xml']):
+		print(xml_cache.report())
 
 def main(argv):
-	global opts
+	global opts, metadata, xml_cache, models
 	opts, articles = get_command_args(argv)
-	metadata = DatabaseManager().get_metadata()
-	articles = list(set(articles))
+	if (opts['snapshot']):
+		DatabaseManager.metadata_snapshot = opts['snapshot']
+	if (opts['dictionary']):
+		metadata = DatabaseManager().load_data_dictionary(opts['dictionary'])
+	else:
+		metadata = DatabaseManager().get_metadata()
+	if (not opts['text_cache']):
+		RawArticle.text_cache = None
+	if (opts['xml_cache'] is not None):
+		xml_cache = PubmedCache(opts['xml_cache'],ttl=opts['xml_cache_ttl'],offline=opts['offline'])
+	elif (opts['offline']):
+		print("--offline needs the pubmed xml cache, no pubmed xml will be loaded")
+		xml_cache = PubmedCache(os.devnull,offline=True)
 
 	if (opts['ml']):
-		train(articles)
+		#training needs every article at once
+		train(list(articles))
 		#cant run train and other functions
 		return
+	if (opts['models']):
+		models = load_models()
 
 	if (opts['zxml']):
 		#opts['zxml'] is the xml file
-		for (bs,each_id) in ArticleManager().get_articles_xml(opts['zxml'],opts['ident'],articles):
-			art = XMLArticle(each_id,opts['ident'],run_style=opts['indi'],metadata=metadata,bs=bs)
-			extract(art)
+		found = prefetch(ArticleManager().get_articles_indexed(opts['zxml'],opts['ident'],articles),lambda pair: article_pmid(pair[1]) or XMLArticle.pmid(pair[0]))
+		if (opts['workers'] > 1):
+			extract_batch((each_id,str(bs),pubmed) for ((bs,each_id),pubmed) in found)
+		else:
+			for ((bs,each_id),pubmed) in found:
+				art = XMLArticle(each_id,opts['ident'],run_style=opts['indi'],metadata=metadata,bs=bs)
+				queue_redcap(extract(art,pubmed=pubmed))
+		flush_redcap()
+		report_cache()
 		return
 
 	else:
-		for each_article in articles:
-			try:
-				art = PDFArticle("{}/{}".format(opts['dir'],each_article),each_article,opts['ident'],run_style=opts['indi'],metadata=metadata)
-				extract(art)
-			except TypeError as e:
-				print("{} not found".format(each_article))
-				continue
+		found = prefetch(articles,article_pmid)
+		if (opts['workers'] > 1):
+			extract_batch((each_article,None,pubmed) for (each_article,pubmed) in found)
+		else:
+			for (each_article,pubmed) in found:
+				try:
+					art = PDFArticle("{}/{}".format(opts['dir'],each_article),each_article,opts['ident'],run_style=opts['indi'],metadata=metadata)
+					queue_redcap(extract(art,pubmed=pubmed))
+				except TypeError as e:
+					print("{} not found".format(each_article))
+					continue
+		flush_redcap()
+		report_cache()
 
 if __name__ == "__main__":
 	main(sys.argv[1:])
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from getopt import getopt
+import os, sys
+sys.path.append("{0}/Desktop/cbmi/reproduce/python/MedicalResearchTool/objects".format(os.environ['HOME'])) #TODO
+sys.path.append("{0}/Desktop/cbmi/reproduce/python/MedicalResearchTool".format(os.environ['HOME']))
+from ErrorAnalytics import ErrorAnalytics
+
+"""
+Interface for running ErrorAnalytics methods over the error log (errors.db):
+	error_rates
+	top_articles
+	retry_candidates
+See ErrorAnalytics for more information
+Rows are printed as sqlite produces them (tab-separated), so reports over very large logs start printing right away
+
+Depends on imported modules:
+	os				-- https://docs.python.org/3/library/os.html
+	sys				-- https://docs.python.org/3/library/sys.html
+	getopt 			-- https://docs.python.org/3.1/library/getopt.html
+See documentation for more information
+
+Command line arguemnts:
+	--database=, -d 		-- location of the error log (default: errors.db)
+	--rates=, -r 			-- count errors per 'method', 'field', 'object' or 'identifier' (execute ErrorAnalytics.error_rates)
+	--top=, -t 				-- list the {--top} articles with the most errors (execute ErrorAnalytics.top_articles)
+	--retry, -c				-- list articles that failed in a way worth retrying (execute ErrorAnalytics.retry_candidates)
+								prints one article id per line, so the output can be saved and passed to executer with -f
+	--since=, -s			-- only consider errors logged at or after this time ('YYYY-MM-DD' or 'YYYY-MM-DD HH:MM:SS')
+	--until=, -u			-- only consider errors logged at or before this time ('YYYY-MM-DD' or 'YYYY-MM-DD HH:MM:SS')
+
+Examples:
+christian$ ./query_errors.py --rates=method --since=2016-08-01
+method	errors	percent	articles
+xml_load	412	81.1	409
+enter_redcap	90	17.7	61
+record_error	6	1.2	6
+#calls ErrorAnalytics.error_rates
+#how many errors each method raised since August 1st, and how many articles they affected
+
+christian$ ./query_errors.py -r field -s 2016-08-01 -u 2016-08-02
+field	errors	percent	articles
+author_ln	54	59.3	41
+analysis_sw	21	23.1	21
+...
+#calls ErrorAnalytics.error_rates
+#which redcap fields caused the most errors on August 1st
+
+christian$ ./query_errors.py --top=3
+article_id	identifier	errors	methods	last error
+24433938	pmid	14	xml_load,parse_xml	2016-08-02 01:13:09
+10.1016/j.burns.2013.12.002	doi	9	enter_redcap	2016-08-02 01:20:44
+26744482	pmid	7	xml_load	2016-08-01 17:45:01
+#calls ErrorAnalytics.top_articles
+
+christian$ ./query_errors.py --retry --since="2016-08-01 22:00" > retry.txt
+christian$ ./executer.py -f retry.txt -i pmid -xr
+#calls ErrorAnalytics.retry_candidates
+#re-runs every pmid that failed to load or enter redcap since 10pm
+"""
+
+
+def get_command_args(argv):
+	database = 'errors.db'
+	rates = since = until = ''
+	top = retry = 0
+	opts, args = getopt(argv,"d:r:t:cs:u:",["database=","rates=","top=","retry","since=","until="])
+	for opt,arg in opts:
+		if opt in ("-d","--database"):
+			database = arg
+		elif opt in ("-r","--rates"):
+			rates = arg
+		elif opt in ("-t","--top"):
+			top = int(arg)
+		elif opt in ("-c","--retry"):
+			retry = 1
+		elif opt in ("-s","--since"):
+			since = arg
+		elif opt in ("-u","--until"):
+			until = arg
+	return {
+		'database':database,
+		'rates':rates,
+		'top':top,
+		'retry':retry,
+		'since':since,
+		'until':until
+		}
+
+def report(header,rows):
+	print("\t".join(header))
+	for row in rows:
+		print("\t".join(str(value) for value in row))
+
+def main(argv):
+	opts = get_command_args(argv)
+	if (not os.path.isfile(opts['database'])):
+		print("no error log at: {}".format(opts['database']))
+		return
+	ea = ErrorAnalytics(opts['database'])
+
+	if (opts['rates']):
+		report([opts['rates'],'errors','percent','articles'],ea.error_rates(opts['rates'],opts['since'],opts['until']))
+	if (opts['top']):
+		report(['article_id','identifier','errors','methods','last error'],ea.top_articles(opts['top'],opts['since'],opts['until']))
+	if (opts['retry']):
+		for (article_id,identifier,methods,last) in ea.retry_candidates(opts['since'],opts['until']):
+			print(article_id)
+
+if __name__ == "__main__":
+	main(sys.argv[1:])
@@ -4,11 +4,15 @@
 import requests
 from ArticleExtractor import ArticleExtractor
 from XMLExtractor import XMLExtractor
+from TextCache import TextCache
+from PDFSections import PDFSections
 import bs4
 import re,sys
 import textract, nltk
 
 class RawArticle(object):
+	text_cache = TextCache()		#set to None to always run textract (executer --no-text-cache)
+
 	def __init__(self,file):
 		self.text = self.get_text(file)
 
@@ -16,15 +20,28 @@ class RawArticle(object):
 	def get_text(self,file):
 		if (not re.search(r'.pdf',file)):
 			file = file + ".pdf"
+		key = None
+		if (self.text_cache):
+			try:
+				key = self.text_cache.key(file)		#hashed once, for both the lookup and the put after a miss
+			except OSError:
+				pass 		#textract reports the missing file below
+			else:
+				text = self.text_cache.get(file,key)
+				if (text is not None):
+					return text
 		try:
 			text = textract.process(file)
 			text = text.strip()
 			text = re.sub(b'\n+',b" ",text)
 			text = re.sub(b'\s+',b" ",text)
-			return text.decode("utf-8")
+			text = text.decode("utf-8")
 		except Exception as e:
 			print("file: {} not found\ninformation from textract:\n\t{}".format(file,e))
 			return 0
+		if (self.text_cache and key):
+			self.text_cache.put(file,text,key)
+		return text
 
 class XMLArticle(ArticleExtractor,XMLExtractor):
 	def __init__(self,article_id,identifier,**kwargs):
@@ -41,10 +58,41 @@ class XMLArticle(ArticleExtractor,XMLExtractor):
 		super(XMLArticle,self).__init__(**kwargs) 	#pass run_style and metadata keyword argument on to ArticleExtractor constructor (if provided)
 		self.article_id = article_id
 		self.identifier = identifier
-
-	def pmid(self,bs):
+		self.index_sections()
+
+	def index_sections(self):
+		"""
+		Index the article's sections in a single pass over its tree, so xml_section never searches the tree again
+			self.sec_types 	-- {sec-type: <sec> tag}, 'materials|methods' is indexed under both 'materials' and 'methods'
+			self.sec_titles -- {normalized title: parent tag of the <title>}
+		The first section with a given sec-type or title wins
+		Section text (and the full text of the article) is computed the first time it's asked for, then reused, see text_of
+		"""
+		self.sec_types = {}
+		self.sec_titles = {}
+		self.texts = {}
+		for tag in self.bs.find_all(['sec','title']):
+			if (tag.name == 'sec'):
+				for sec_type in tag.get('sec-type','').split('|'):
+					if (sec_type):
+						self.sec_types.setdefault(self.normalize(sec_type),tag)
+			elif (tag.parent is not None):
+				self.sec_titles.setdefault(self.normalize(tag.get_text()),tag.parent)
+
+	@staticmethod
+	def normalize(title):
+		#'  Materials and\nMethods: ' -> 'materials and methods'
+		return " ".join(title.split()).lower().rstrip('.:')
+
+	def text_of(self,tag):
+		if (id(tag) not in self.texts):
+			self.texts[id(tag)] = tag.text
+		return self.texts[id(tag)]
+
+	@staticmethod
+	def pmid(bs):
 		try:
-			return bs.find(("article-id",{"pub-id-type":"pmid"})).text
+			return bs.find("article-id",{"pub-id-type":"pmid"}).text
 		except AttributeError as e:
 			#pubmed id not found
 			return ""
@@ -73,18 +121,23 @@ class XMLArticle(ArticleExtractor,XMLExtractor):
 			return 0
 
 	def xml_section(self,*titles):
+		"""
+		Get the text of the first of {titles} the article has a section for (matched by sec-type, then by section title)
+		Return: text of the section, or the full text of the article if it has none of the sections (string)
+		"""
 		for title in titles:
-			if (self.bs.find("sec",{"sec-type":title})):
-				return self.bs.find("sec",{"sec-type":title}).text
-			if (self.bs.find("title",text=title)):
-				return self.bs.find("title",text=re.compile(title,re.I)).parent.text
-		return self.bs.text
+			title = self.normalize(title)
+			if (title in self.sec_types):
+				return self.text_of(self.sec_types[title])
+			if (title in self.sec_titles):
+				return self.text_of(self.sec_titles[title])
+		return self.text_of(self.bs)
 
 	def get_hypotheses(self):
 		return self._get_hypotheses(self.xml_section('background','introduction'))
 
 	def get_funding(self):
-		return self._get_funding(self.bs.text)
+		return self._get_funding(self.text_of(self.bs))
 
 	def get_inex_criteria(self):
 		return self._get_inex_criteria(self.xml_section('methods'))
@@ -98,8 +151,9 @@ class XMLArticle(ArticleExtractor,XMLExtractor):
 	def get_nlp(self):
 		return self._get_nlp(self.xml_section('methods'))
 
-	def get_analysis(self,classifier):
-		return self._get_analysis(classifier.classify(self.xml_section('methods')))
+	def get_analysis(self,classifier=None):
+		#the model was trained on the whole text of articles (see Trainer), so it classifies the whole text
+		return self._get_analysis(self.text_of(self.bs),classifier)
 
 	def get_stats(self):
 		return self._get_stats(self.xml_section('methods'))
@@ -115,44 +169,50 @@ class PDFArticle(ArticleExtractor,XMLExtractor):
 		self.entry = {}
 		super(PDFArticle,self).__init__(**kwargs)
 		self.text = RawArticle(file).text
+		self.sections = PDFSections(self.text)
 		self.article_id = article_id
 		self.identifier = identifier
 
+	def pdf_section(self,*names):
+		"""
+		Get the text of the first of {names} the article has a heading for (see PDFSections)
+		Return: text of the section, or the text before the references if the article has none of the sections
+		"""
+		return self.sections.section(*names)
+
 	def get_clinical_domain_from_pdf(self):
-		for each_sent in nltk.sent_tokenize(self.text):
+		for each_sent in self.triggered(self.text,'keywords'):
 			search = re.search(r'key.*?words(.*)',each_sent,re.I)
-			if (search):
-				key_words = re.sub(r'[()]',"",search.group(1))
-				key_words = key_words.split()
-				self.get_clinical_domain(key_words)
+			key_words = re.sub(r'[()]',"",search.group(1))
+			key_words = key_words.split()
+			self.get_clinical_domain(key_words)
 
 	def get_hypotheses(self):
-		return self._get_hypotheses(self.text)
+		return self._get_hypotheses(self.pdf_section('introduction'))
 
 	def get_funding(self):
 		return self._get_funding(self.text)
 
 	def get_inex_criteria(self):
-		return self._get_inex_criteria(self.text)
+		return self._get_inex_criteria(self.pdf_section('methods'))
 
 	def get_databases(self):
-		return self._get_databases(self.text)
+		return self._get_databases(self.pdf_section('methods'))
 
 	def get_query(self):
-		return self._get_query(self.text)
+		return self._get_query(self.pdf_section('methods'))
 
 	def get_nlp(self):
-		return self._get_nlp(self.text)
+		return self._get_nlp(self.pdf_section('methods'))
 
 	def get_stats(self):
-		return self._get_stats(self.text)
+		return self._get_stats(self.pdf_section('methods'))
 
 	def get_limitations(self):
-		return self._get_limitations(self.text)
+		return self._get_limitations(self.pdf_section('limitations','discussion','conclusion'))
 
-	def get_analysis(self):
-		return #TODO, run machine learning
-		return self._get_analysis(self.text)
+	def get_analysis(self,classifier=None):
+		return self._get_analysis(self.text,classifier)
 
 	def get_institution(self,affiliation):
 		return self._get_institution(affiliation)
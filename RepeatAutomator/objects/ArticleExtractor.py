@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 
 import os, sys, re
+from collections import OrderedDict
 sys.path.append("{0}/Desktop/cbmi/reproduce/python/MedicalResearchTool/objects".format(os.environ['HOME'])) #TODO
 sys.path.append("{0}/Desktop/cbmi/reproduce/python/MedicalResearchTool".format(os.environ['HOME']))
 
@@ -11,8 +12,26 @@ from pprint import pprint
 from stemming.porter2 import stem
 from ArticleManager import ArticleManager
 from DatabaseManager import DatabaseManager
+from SegmentedText import SegmentedText
+from SentenceScanner import SentenceScanner
 from bs4 import BeautifulSoup
 
+#patterns run on sentences after SentenceScanner has found the sentence relevant
+GRANT_ID = re.compile(r"grant.*?(\w*\d[\w\d/-]*)",re.I)
+GRANT_FROM = re.compile(r'grant.*?from (.*?)[^\w\s-]',re.I|re.S)
+FUNDED_BY = re.compile(r'funded.*?by (.*?)[^\w\s-]',re.I|re.S)
+ANALYSES_PERFORMED = re.compile(r'analys[ie]s (were)?(was)? performed\s+\w+\W+(.*?)\s',re.I)
+WERE_USING = re.compile(r'were\s\w*\susing\s(.*?)\s',re.I)
+STANDARDS = [(stand,re.compile(stand + r'.*?(\d[\d\.]*\d)')) for stand in ["STATA","SAS","SPSS"]]
+R_VERSION = re.compile(r'\sR\s.*?(\d[\d\.]*\d)')
+INSTITUTION = re.compile(r'hospital|university|school|college|institute',re.I)
+
+#words that never identify a clinical domain, on top of the english stopwords, see ArticleExtractor.get_clinical_domain
+DOMAIN_STOPWORDS = frozenset(['health','disease','medicine','medical','sciences','international'])
+
+#chunks begin and end with a proper noun, see ArticleExtractor.chunker
+CHUNK_PARSER = nltk.RegexpParser(r"Chunk: {<NNP.?><NNP.?|NN.?|,|\(|\)|:|IN|CC|DT>*<NNP.?|\)>}")
+
 class ArticleExtractor(ArticleManager):
 	"""
 	Extract study information from the article text
@@ -35,8 +54,52 @@ class ArticleExtractor(ArticleManager):
 	See ArticleManager for additional documentation
 	"""
 
+	chunk_cache = OrderedDict()		#sentence -> chunk tree, least recently used first, shared by every article in the process
+	chunk_cache_size = 4096
+	stopwords = None 				#english stopwords, loaded from nltk on first use, see get_stopwords
+	domain_index = (None,{})		#(choice tables, index) for the choice tables indexed last, see get_domain_index
+
 	def __init__(self,**kwargs):
 		super(ArticleExtractor,self).__init__(**kwargs) 	#pass run_style and metadata keyword argument on to ArticleManager constructor (if provided)
+		self.segmented = {}		#text -> SegmentedText, so each text is only split into sentences once per article
+		self.scanned = {}		#text -> {rule: SentenceScanner hits}, so each sentence is only matched once per rule per article
+
+	def segment(self,text):
+		"""
+		Split text into sentences, reusing the result if this text was already segmented for the article
+		Args: text -- text from the article to be extracted (string)
+		Return: SegmentedText object (iterable of sentences, see SegmentedText for more information)
+
+		Example:
+		>>> ae = ArticleExtractor()
+		>>> ae.segment("Data were abstracted. SAS was used.").sentences
+		['Data were abstracted.', 'SAS was used.']
+		>>> ae.segment("Data were abstracted. SAS was used.") is ae.segment("Data were abstracted. SAS was used.")
+		True
+		"""
+		if (text not in self.segmented):
+			self.segmented[text] = SegmentedText(text)
+		return self.segmented[text]
+
+	def triggered(self,text,rule):
+		"""
+		Get the sentences of text that trigger a SentenceScanner rule
+		Only the requested rule is scanned for, the first time it is requested for the text (a PDFArticle section is usually only searched by one rule);
+		later requests are a dictionary lookup
+		Args:
+			text 	-- text from the article to be extracted (string)
+			rule 	-- name of a rule in SentenceScanner.TRIGGERS (string)
+		Return: list of sentences (strings), in the order they appear in text
+
+		Example:
+		>>> ae = ArticleExtractor()
+		>>> ae.triggered("We hypothesized it would rain. Patients were excluded.","inclusion")
+		['Patients were excluded.']
+		"""
+		hits = self.scanned.setdefault(text,{})
+		if (rule not in hits):
+			hits.update(SentenceScanner.scan(self.segment(text),[rule]))
+		return hits[rule]
 
 	def clean_entry(self):
 		"""
@@ -146,28 +209,88 @@ class ArticleExtractor(ArticleManager):
 		Tree('S', [('12', 'CD')])
 		"""
 		try:
-			words = nltk.word_tokenize(sentence)
-			tagged = nltk.pos_tag(words)
-			#tagged = nltk.pos_tag([word.rstrip(''.join([str(i) for i in range(10)])) for word in words])
-			chunkGram = r"Chunk: {<NNP.?><NNP.?|NN.?|,|\(|\)|:|IN|CC|DT>*<NNP.?|\)>}"
-			chunkedParser = nltk.RegexpParser(chunkGram)
-			chunked = chunkedParser.parse(tagged)
-			return chunked
+			return self.chunk_all([sentence])[0]
 		except TypeError as e:
 			print("chunker called on: '{}' \n{} is type: {} but must be a string or bytes-like object".format(sentence,sentence,type(sentence)))
 			print("retrying with cast to string")
 			return self.chunker(str(sentence))
 
+	def chunk_all(self,sentences):
+		"""
+		Chunk many sentences (see chunker), part-of-speech tagging every sentence that isnt cached in one nltk.pos_tag_sents call
+		Chunk trees are kept in a least recently used cache of {chunk_cache_size} sentences,
+		so boilerplate sentences repeated across articles are only tagged once
+		Args: sentences -- (list of strings)
+		Return: list of nltk.tree.Tree objects, in the order of sentences
+		Raise TypeError if a sentence isnt a string
+
+		Example:
+		>>> ae = ArticleExtractor()
+		>>> [tree.label() for tree in ae.chunk_all(["Data came from the National Stroke Register","The database was queried"])]
+		['S', 'S']
+		"""
+		cache = ArticleExtractor.chunk_cache
+		missing = list(OrderedDict.fromkeys(sentence for sentence in sentences if sentence not in cache))
+		if (missing):
+			tagged = nltk.pos_tag_sents([nltk.word_tokenize(sentence) for sentence in missing])
+			for (sentence,tags) in zip(missing,tagged):
+				cache[sentence] = CHUNK_PARSER.parse(tags)
+		trees = []
+		for sentence in sentences:
+			cache.move_to_end(sentence)
+			trees.append(cache[sentence])
+		while (len(cache) > self.chunk_cache_size):
+			cache.popitem(last=False)
+		return trees
+
+
+	@classmethod
+	def get_stopwords(cls):
+		"""
+		Get nltk's english stopwords, loaded once per process
+		Return: frozenset of strings
+		"""
+		if (cls.stopwords is None):
+			ArticleExtractor.stopwords = frozenset(nltk.corpus.stopwords.words('english'))
+		return ArticleExtractor.stopwords
+
+	def get_domain_index(self):
+		"""
+		Index the clinical_domain choices by the stems of the words in them
+		Built once per set of choice tables (see ArticleManager.get_choice_tables), so every article in a run shares it
+		Return: dictionary of format: {stem: (domain, ...)}, domains in the order redcap lists them
+
+		Example:
+		>>> ae = ArticleExtractor()
+		>>> ae.get_domain_index()['surgeri']
+		('Orthopaedic Surgery', 'Surgery')
+		"""
+		tables = self.get_choice_tables()
+		(indexed,index) = ArticleExtractor.domain_index
+		if (indexed is not tables):
+			index = {}
+			stopwords = self.get_stopwords()
+			table = tables.get('clinical_domain')
+			for domain in (table.options if table else []):
+				for word in re.findall(r'\w+',domain.lower()):
+					if (word not in stopwords and word not in DOMAIN_STOPWORDS):
+						domains = index.setdefault(stem(word),[])
+						if (domain not in domains):
+							domains.append(domain)
+			index = {word:tuple(domains) for (word,domains) in index.items()}
+			ArticleExtractor.domain_index = (tables,index)
+		return index
 
 	def get_clinical_domain(self,key_words):
 		"""
 		Get the clinical domain of the article
 		Args: key_words 	-- words to search against the clinical domain choices (list of strings)
-		Return: int value corresponding to redcap key for given domain, or 0 if no keyword matches (unknown domain) or keywords is invalid type
+		Return: the first clinical domain choice that shares a word stem with a keyword (keywords are tried in order),
+			or 0 if no keyword matches (unknown domain) or keywords is invalid type
 		Example:
 		>>> ae = ArticleExtractor()
 		>>> ae.get_clinical_domain(['Neurology'])
-		23
+		'Neurology'
 		>>> ae.get_clinical_domain(['The American Dream'])
 		0
 		>>> ae.get_clinical_domain(12)
@@ -177,13 +300,12 @@ class ArticleExtractor(ArticleManager):
 			return
 		if (type(key_words) is not list):
 			return 0
-		stopwords = nltk.corpus.stopwords.words('english') + ['health','disease','medicine','medical','sciences','medicine','international']
-		key_words = [stem(word.lower().strip()) for word in key_words if word.lower() not in stopwords]
-		domains = self.get_choices("clinical_domain")
-		for word in key_words:
-			for domain in domains:
-				if (re.search(re.escape(word),domain,re.I)):
-					return domain
+		stopwords = self.get_stopwords()
+		index = self.get_domain_index()
+		for key_word in key_words:
+			for word in re.findall(r'\w+',key_word.lower()):
+				if (word not in stopwords and word not in DOMAIN_STOPWORDS and stem(word) in index):
+					return index[stem(word)][0]
 		return 0
 
 	def _get_hypotheses(self,text):
@@ -210,15 +332,14 @@ class ArticleExtractor(ArticleManager):
 		{'hypothesis_gen_or_driv':2}
 
 		"""
-		for each_sent in nltk.sent_tokenize(text):
-			if (re.search(r'we.*?hypothes',each_sent,re.I)):
-				self.check("Hypothesis Driven or Hypothesis Generating",1,each_sent,"hypothesis_gen_or_driv",display="driven")
-				if ("hypothesis_gen_or_driv" in self.entry):
-					#we didnt encounter any articles that stated null and alternate hypotheses. Here's how we might ask
-					self.generate_chooser("Does the publication state null and alternative hypotheses?",self.get_choices("clear_hypothesis"),info=each_sent)
-					if (self.user_choice != -1):
-						self.entry['clear_hypothesis'] = self.user_choice
-					return
+		for each_sent in self.triggered(text,'hypothesis'):
+			self.check("Hypothesis Driven or Hypothesis Generating",1,each_sent,"hypothesis_gen_or_driv",display="driven")
+			if ("hypothesis_gen_or_driv" in self.entry):
+				#we didnt encounter any articles that stated null and alternate hypotheses. Here's how we might ask
+				self.generate_chooser("Does the publication state null and alternative hypotheses?",self.get_choices("clear_hypothesis"),info=each_sent)
+				if (self.user_choice != -1):
+					self.entry['clear_hypothesis'] = self.user_choice
+				return
 		self.entry['hypothesis_gen_or_driv'] = 2
 		return
 
@@ -265,17 +386,17 @@ class ArticleExtractor(ArticleManager):
 		>>> ae.entry
 		{'funders': 'Wayne Enterprises'}
 		"""
-		for each_sent in nltk.sent_tokenize(text):
-			if (re.search(r'funded.*?by',each_sent,re.I|re.S)):
-				search = re.search(r"grant.*?(\w*\d[\w\d/-]*)",each_sent,re.I)
-				if (search):
-					self.check("Grant ID",search.group(1).strip(),each_sent,"grant_ids")
-				search = re.search(r'grant.*?from (.*?)[^\w\s-]',each_sent,re.I|re.S)
+		for each_sent in self.triggered(text,'funding'):
+			search = GRANT_ID.search(each_sent)
+			if (search):
+				self.check("Grant ID",search.group(1).strip(),each_sent,"grant_ids")
+			search = GRANT_FROM.search(each_sent)
+			if (search):
+				self.check("Funders",search.group(1).strip(),each_sent,"funders")
+			else:
+				search = FUNDED_BY.search(each_sent)
 				if (search):
 					self.check("Funders",search.group(1).strip(),each_sent,"funders")
-				else:
-					search = re.search(r'funded.*?by (.*?)[^\w\s-]',each_sent,re.I|re.S)
-					self.check("Funders",search.group(1).strip(),each_sent,"funders")
 
 	def _get_inex_criteria(self,text):
 		"""
@@ -303,16 +424,13 @@ class ArticleExtractor(ArticleManager):
 		{'inclusion_and_exclusion_stated': '1', 'inclusion_exclu_location___3': 1}
 
 		"""
-		for each_sent in nltk.sent_tokenize(text):
-			copy = each_sent
-			if(re.search(r'were\W*includ',each_sent,re.I) or re.search(r'were\W*exclud',each_sent,re.I) or
-				re.search(r'inclus',each_sent,re.I) or (re.search(r'exclus',each_sent,re.I) and not re.search(r'exclusively',each_sent,re.I))):
-				if ("inclusion_and_exclusion_stated" not in self.entry):
-					self.check_boolean("Inclusion Exclusion Criteria Stated",1,each_sent,"inclusion_and_exclusion_stated",display='yes')
-				if ("inclusion_and_exclusion_stated" in self.entry):
-					self.entry['inclusion_exclu_location___3'] = 1
-					self.check_ontol(each_sent)
-					return
+		for each_sent in self.triggered(text,'inclusion'):
+			if ("inclusion_and_exclusion_stated" not in self.entry):
+				self.check_boolean("Inclusion Exclusion Criteria Stated",1,each_sent,"inclusion_and_exclusion_stated",display='yes')
+			if ("inclusion_and_exclusion_stated" in self.entry):
+				self.entry['inclusion_exclu_location___3'] = 1
+				self.check_ontol(each_sent)
+				return
 
 	def check_ontol(self,info):
 		"""
@@ -395,24 +513,23 @@ class ArticleExtractor(ArticleManager):
 		{'db_citation_1': 'National Stroke Register , Riksstroke', 'state_data_sources': 1}
 		"""
 
-		for each_sent in nltk.sent_tokenize(text):
-			if (re.search(r'database',each_sent,re.I)):
-				tree = self.chunker(each_sent)
-				sts = []
-				try:
-					for st in tree.subtrees(lambda tree: tree.height() == 3):
-						for st2 in st.subtrees(lambda tree: tree.height() == 2):
-							sts.append([str(tup[0]) for tup in st2.leaves()])
-					if (len(sts) > 0):
-						longest_chunk = max(sts,key=len)
-						self.check("Database Name",' '.join(longest_chunk),each_sent,"db_citation_1")
-					if ('db_citation_1' in self.entry):
-						self.entry['state_data_sources'] = 1
-						self.entry['state_database_where___4'] = 1
-						return
-				except AttributeError as e:
-					#chunker run on invalid data type, didnt return a tree
-					pass
+		sentences = self.triggered(text,'database')
+		for (each_sent,tree) in zip(sentences,self.chunk_all(sentences)):
+			sts = []
+			try:
+				for st in tree.subtrees(lambda tree: tree.height() == 3):
+					for st2 in st.subtrees(lambda tree: tree.height() == 2):
+						sts.append([str(tup[0]) for tup in st2.leaves()])
+				if (len(sts) > 0):
+					longest_chunk = max(sts,key=len)
+					self.check("Database Name",' '.join(longest_chunk),each_sent,"db_citation_1")
+				if ('db_citation_1' in self.entry):
+					self.entry['state_data_sources'] = 1
+					self.entry['state_database_where___4'] = 1
+					return
+			except AttributeError as e:
+				#chunker run on invalid data type, didnt return a tree
+				pass
 		self.entry['state_data_sources'] = 0
 
 	def _get_query(self,text):
@@ -441,18 +558,11 @@ class ArticleExtractor(ArticleManager):
 		>>> ae.entry
 		{'query_method_stated': '1', 'query_method_location___4': 1}
 		"""
-		for each_sent in nltk.sent_tokenize(text):
-			if (re.search(r'abstracted',each_sent,re.I) or
-					re.search(r'manual',each_sent,re.I) or
-					re.search(r'query',each_sent,re.I) or
-					(re.search('records',each_sent,re.I) and re.search('review',each_sent,re.I))):
-				self.check_boolean("Query Method Stated",1,each_sent,"query_method_stated",display='yes')
+		for each_sent in self.triggered(text,'query'):
+			self.check_boolean("Query Method Stated",1,each_sent,"query_method_stated",display='yes')
 			if ('query_method_stated' in self.entry):
 				self.entry['query_method_location___4'] = 1		#query method given in body of article
 				return
-			else:
-				self.entry['query_method_stated'] = 0
-				return
 		self.entry['query_method_stated'] = 0
 
 	def _get_nlp(self,text):
@@ -467,33 +577,40 @@ class ArticleExtractor(ArticleManager):
 
 		Ask user if article states source of text from which data were mined
 		"""
-		for each_sent in nltk.sent_tokenize(text):
-			if (re.search(r'language\spro',each_sent,re.I) or re.search(r'\snlp\s',each_sent,re.I)):
-				self.check_boolean("Research Involves Natural Language Processing",1,each_sent,"text_nlp_yn",display='yes')
-				if ("text_nlp_yn" in self.entry):
-					if (self.ask_without_choices("Does the publication state source of the text from which data were mined? (ex: emergency department summary, operative notes, etc)\n","Enter the source of text: ","text_mine_source")):
-						if (re.search(r'appendix',each_sent,re.I)):
-							if (self.check_boolean("Manuscript shares a pre-processed sample text source in",9,each_sent,"nlp_source_shared_loc",display="appendix")):
-								self.assign("text_mining_preprocess",1)
-						elif (re.search(r'\Wgit',each_sent,re.I)):
-							if (self.check_boolean("Manuscript shares a pre-processed sample text source in",5,each_sent,"nlp_source_shared_loc",display="GitHub")):
-								self.assign("text_mining_preprocess",1)
-						if ("text_mining_preprocess" not in self.entry):
-							if (self.ask_question("Do they share a pre-processed sample of the text source?")):
-								self.assign("text_mining_preprocess",1)
-								self.ask("Where is the sample shared?","nlp_source_shared_loc")
-						if (self.ask_without_choices("Does the publication state software used for text mining?","Enter softwares used: ","nlp_software")):
-							self.ask("Is the software open or proprietary?","nlp_software_open")
-						return
-
-	def _get_analysis(self,text):
-		return #TODO, run machine learning algorithm
-		for each_sent in nltk.sent_tokenize(text):
-			if (re.search(r'statistical analys[ie]s',each_sent,re.I) or re.search(r'data analys[ie]s',each_sent,re.I)):
-				if (self.check_boolean("Publications States Analysis Methodology And Process",1,each_sent,"analysis_processes_clear",display='yes')):
-					self.entry['data_analysis_doc_loc'] = 4
+		for each_sent in self.triggered(text,'nlp'):
+			self.check_boolean("Research Involves Natural Language Processing",1,each_sent,"text_nlp_yn",display='yes')
+			if ("text_nlp_yn" in self.entry):
+				if (self.ask_without_choices("Does the publication state source of the text from which data were mined? (ex: emergency department summary, operative notes, etc)\n","Enter the source of text: ","text_mine_source")):
+					if (re.search(r'appendix',each_sent,re.I)):
+						if (self.check_boolean("Manuscript shares a pre-processed sample text source in",9,each_sent,"nlp_source_shared_loc",display="appendix")):
+							self.assign("text_mining_preprocess",1)
+					elif (re.search(r'\Wgit',each_sent,re.I)):
+						if (self.check_boolean("Manuscript shares a pre-processed sample text source in",5,each_sent,"nlp_source_shared_loc",display="GitHub")):
+							self.assign("text_mining_preprocess",1)
+					if ("text_mining_preprocess" not in self.entry):
+						if (self.ask_question("Do they share a pre-processed sample of the text source?")):
+							self.assign("text_mining_preprocess",1)
+							self.ask("Where is the sample shared?","nlp_source_shared_loc")
+					if (self.ask_without_choices("Does the publication state software used for text mining?","Enter softwares used: ","nlp_software")):
+						self.ask("Is the software open or proprietary?","nlp_software_open")
 					return
 
+	def _get_analysis(self,text,classifier=None):
+		"""
+		Determine whether the article states its analysis methodology and process
+		Args: text -- text from the article to be extracted (string)
+		KeywordArgs: classifier -- model trained for analysis_processes_clear (ModelArtifact, see Trainer), None to skip the field
+		Return: void
+
+		The model decides from the words of the whole text, the sentence shown to the user is the first one naming the analysis
+		"""
+		if (classifier is None or not classifier.classify(text)):
+			return
+		sentences = [each_sent for each_sent in self.segment(text) if re.search(r'(?:statistical|data) analys[ie]s',each_sent,re.I)]
+		info = sentences[0] if sentences else "(predicted by the model trained on {} articles)".format(classifier.training.get('articles','?'))
+		if (self.check_boolean("Publications States Analysis Methodology And Process",1,info,"analysis_processes_clear",display='yes')):
+			self.entry['data_analysis_doc_loc'] = 4
+
 
 
 	def _get_stats(self,text):
@@ -534,12 +651,12 @@ class ArticleExtractor(ArticleManager):
 			self.entry['software_analysis_code'] = 1
 			return
 
-		for each_sent in nltk.sent_tokenize(text):
-			search = re.search(r'analys[ie]s (were)?(was)? performed\s+\w+\W+(.*?)\s',each_sent,re.I)
+		for each_sent in self.triggered(text,'stats'):
+			search = ANALYSES_PERFORMED.search(each_sent)
 			if (search):
 				self.check("Analyses Software",search.group(3).strip(),each_sent,"analysis_sw")
 			else:
-				search = re.search(r'analys',each_sent,re.I) and re.search(r'were\s\w*\susing\s(.*?)\s',each_sent,re.I)
+				search = WERE_USING.search(each_sent)
 				if (search):
 					self.check("Analyses Software",search.group(1),each_sent,"analysis_sw")
 			if ("analysis_sw" in self.entry):
@@ -572,21 +689,20 @@ class ArticleExtractor(ArticleManager):
 		>>> ae.entry
 		{'analysis_sw':'SAS,SPSS',}
 		"""
-		stands = ["STATA","SAS","SPSS"]
-		for each_sent in nltk.sent_tokenize(text):
-			for stand in stands:
-				if re.search(stand,each_sent):
+		for each_sent in self.triggered(text,'standards'):
+			for (stand,version) in STANDARDS:
+				if (stand in each_sent):
 					self.check("Analysis Software",stand,each_sent,"analysis_sw")
 					if ("analysis_sw" in self.entry and stand in self.entry['analysis_sw']):
 						self.entry['analysis_software_open___1'] = 1		#software is proprietary
-						search = re.search(stand + r'.*?(\d[\d\.]*\d)',each_sent)
+						search = version.search(each_sent)
 						if (search):
 							self.check("Analysis Software Version",search.group(1),each_sent,"analysis_sw_version")
 						self.check_operating_system(each_sent)
 			if (re.search(r'analys',each_sent,re.I) and re.search(r'\sR\s',each_sent)):
 				self.check("Analysis Software","R",each_sent,"analysis_sw")
 				if ("analysis_sw" in self.entry and "R" in self.entry['analysis_sw']):
-					search = re.search(r'\sR\s.*?(\d[\d\.]*\d)',each_sent)
+					search = R_VERSION.search(each_sent)
 					if (search):
 						self.check("Analysis Software Version",search.group(1),each_sent,"analysis_sw_version")
 					self.entry['analysis_software_open___2'] = 1 			#software is open-source
@@ -631,11 +747,10 @@ class ArticleExtractor(ArticleManager):
 		>>> ae.entry
 		{'limitations_where___7': '1'}
 		"""
-		for each_sent in nltk.sent_tokenize(text):
-			if (re.search(r'shortcomings',each_sent,re.I) or re.search(r'limitation',each_sent,re.I) or re.search(r'(was)?(is)? limited',each_sent,re.I)):
-				self.check_boolean("Publication Documents Limitations Of The Study",1,each_sent,"limitations_where___7",display='yes')
-				if ("limitations_where___7" in self.entry):
-					return
+		for each_sent in self.triggered(text,'limitations'):
+			self.check_boolean("Publication Documents Limitations Of The Study",1,each_sent,"limitations_where___7",display='yes')
+			if ("limitations_where___7" in self.entry):
+				return
 
 	def _get_institution(self,affiliation):
 		"""
@@ -669,7 +784,7 @@ class ArticleExtractor(ArticleManager):
 		af_from_xml = affiliation.split(", ")
 
 		for option in af_from_xml:		#could tweak slightly
-			if (re.search(r'hospital',option,re.I) or re.search(r'university',option,re.I) or re.search(r'school',option,re.I) or re.search(r'college',option,re.I) or re.search(r'institute',option,re.I)):
+			if (INSTITUTION.search(option)):
 				self.check("Institution",option,"affiliation: '{}'".format(affiliation),"institution_corr_author")
 			if ("institution_corr_author" in self.entry):
 				return
@@ -7,10 +7,16 @@ import sys, re, os
 sys.path.append("{0}/Desktop/cbmi/reproduce/python/MedicalResearchTool/objects".format(os.environ['HOME'])) #TODO
 sys.path.append("{0}/Desktop/cbmi/reproduce/python/MedicalResearchTool".format(os.environ['HOME']))
 
-import pycurl, io, json
-from pprint import pprint
+import json, csv
+from types import MappingProxyType
+from collections import namedtuple
 from bs4 import BeautifulSoup
+from lxml import etree
 from DatabaseManager import DatabaseManager
+from XMLIndex import XMLIndex
+
+Choices = namedtuple('Choices',['options','labels'])
+#choices of one redcap field: options -- {option: value}, labels -- {value: option} (both read-only)
 
 class ArticleManager(DatabaseManager):
 	"""
@@ -24,19 +30,22 @@ class ArticleManager(DatabaseManager):
 		os				-- https://docs.python.org/3/library/os.html
 		sys				-- https://docs.python.org/3/library/sys.html
 		re				-- https://docs.python.org/3/library/re.html
-		pycurl 			-- http://pycurl.io/docs/latest/index.html
 		json 			-- https://docs.python.org/3.4/library/json.html
-		io 				-- https://docs.python.org/3/library/io.html
-		pprint 			-- https://docs.python.org/3/library/pprint.html
+		csv 			-- https://docs.python.org/3/library/csv.html
 		beautiful soup	-- https://www.crummy.com/software/BeautifulSoup/bs4/doc/
+		lxml			-- http://lxml.de/
 		tkinter 		-- https://docs.python.org/3/library/tk.html
 	Inherited methods from DatabaseManager:
 		record_error
 	See documentation for more information
 	"""
 
-	def __init__(self,metadata=DatabaseManager().get_metadata(),run_style=1):
+	choice_tables = (None,{})		#(metadata, choices of each field) for the metadata parsed last, see get_choice_tables
+
+	def __init__(self,metadata=None,run_style=1):
 		self.run_style = run_style
+		if (metadata is None):
+			metadata = self.get_metadata()		#loaded from redcap once per process, see DatabaseManager.get_metadata
 		self.metadata = self.verify_meta(metadata)
 		self.entry = {}
 
@@ -258,8 +267,8 @@ class ArticleManager(DatabaseManager):
 		Get options for a redcap field
 		Args: redcap -- redcap codebook key (string)
 		Return:
-			dictionary of format: {option:value} where value is always an integer
-			for the given {redcap} field
+			read-only dictionary of format: {option:value} where value is always an integer
+			for the given {redcap} field (looked up in tables parsed once from the metadata, see get_choice_tables)
 			-1 if the field:
 			 	isnt limited to select choices
 				is not found in the given metadata
@@ -280,22 +289,74 @@ class ArticleManager(DatabaseManager):
 		>>> am.get_choices('my address')
 		-1
 		"""
-		opt_str = ''
-		for item in self.metadata:
-			if (item['field_name'] == redcap):
-				if (item['field_type'] == "yesno"):
-					return {"yes":1,"no":0}
-				opt_str = item['select_choices_or_calculations']
-		if (not opt_str):
+		table = self.get_choice_tables().get(redcap)
+		if (not table):
 			return -1
-		opt_tup = opt_str.split('|')
-		opt_dic = {}
-		for each_tup in opt_tup:
-			(val,opt) = each_tup.split(',')
-			val = val.strip()
-			opt = opt.strip()
-			opt_dic[opt] = val
-		return opt_dic
+		return table.options
+
+	def get_choice_label(self,redcap,value):
+		"""
+		Get the option of a redcap field that corresponds to a redcap value (reverse of get_choices)
+		Args:
+			redcap 	-- redcap codebook key (string)
+			value 	-- redcap value of the option (string or int)
+		Return: option (string), or None if {redcap} has no option with value {value}
+
+		Example:
+		>>> am = ArticleManager()
+		>>> am.get_choice_label('reviewer','6')
+		'Christian Lukas'
+		>>> am.get_choice_label('reviewer',6)
+		'Christian Lukas'
+		"""
+		table = self.get_choice_tables().get(redcap)
+		if (not table):
+			return None
+		return table.labels.get(str(value))
+
+	def get_choice_tables(self):
+		"""
+		Get the choices of every redcap field in the metadata
+		The metadata is only parsed once: articles built with the same metadata share the tables
+		Return: dictionary of format: {field_name: Choices} for fields limited to select choices
+		"""
+		(parsed,tables) = ArticleManager.choice_tables
+		if (parsed is not self.metadata):
+			tables = self.parse_choices(self.metadata)
+			ArticleManager.choice_tables = (self.metadata,tables)
+		return tables
+
+	def parse_choices(self,metadata):
+		"""
+		Parse the select_choices_or_calculations of every field in metadata
+		Args: metadata -- redcap metadata (list of dictionaries, see verify_meta)
+		Return: dictionary of format: {field_name: Choices}
+
+		yesno fields get the options {"yes":1,"no":0}
+		Options are split on the first comma only, so labels may contain commas:
+		>>> am = ArticleManager()
+		>>> am.parse_choices([{'field_name':'funders','field_type':'radio','select_choices_or_calculations':'1, NIH | 2, Wayne Enterprises, Inc.'}])
+		{'funders': Choices(options=mappingproxy({'NIH': '1', 'Wayne Enterprises, Inc.': '2'}), labels=mappingproxy({'1': 'NIH', '2': 'Wayne Enterprises, Inc.'}))}
+		"""
+		tables = {}
+		for item in metadata:
+			if (item['field_type'] == "yesno"):
+				options = {"yes":1,"no":0}
+			else:
+				options = {}
+				opt_str = item['select_choices_or_calculations']
+				if (not opt_str or item['field_type'] == "calc"):
+					continue
+				for each_tup in opt_str.split('|'):
+					(val,comma,opt) = each_tup.partition(',')
+					if (not comma):
+						continue
+					options[opt.strip()] = val.strip()
+				if (not options):
+					continue
+			labels = dict((str(v),k) for (k,v) in options.items())
+			tables[item['field_name']] = Choices(MappingProxyType(options),MappingProxyType(labels))
+		return tables
 
 
 	def assign(self,redcap,value):
@@ -471,6 +532,7 @@ class ArticleManager(DatabaseManager):
 			identifier 	-- type of article_id (doi, pmc, pmid) (string)
 			search_ids	-- article ids to return beautifulsoup of (list of strings)
 		Return: generator of beautiful soup objects for the list of articles in {search_ids}
+			articles are parsed one at a time as the file is read, and reading stops once every article in {search_ids} is found
 
 		Example:
 		>>> am = ArticleManager()
@@ -495,30 +557,75 @@ class ArticleManager(DatabaseManager):
 			raise TypeError("get_articles_xml method called on invalid type. search_ids must be a list but is type: {}".format(type(search_ids)))
 		search_ids = set(map(str,search_ids))
 
-		with open(file,'r') as x:
-			bs = BeautifulSoup(x.read(),"lxml")
-
-		for ass in bs.find_all("article"):
-			try:
-				article_id = ass.find('article-id',{'pub-id-type':identifier}).text
-				#ass.find('article-id',{'pub-id-type':'pmc'}).text
-			except AttributeError as e:
-				#article doesnt have identifier provided
-				continue
+		#stream the file one <article> at a time so memory is bounded by the largest article, not the file
+		for (event,elem) in etree.iterparse(file,events=('end',),tag='article',huge_tree=True):
+			article_id = ''
+			for each_id in elem.iter('article-id'):
+				if (each_id.get('pub-id-type') == identifier):
+					article_id = (each_id.text or '').strip()
+					break
 			if (article_id in search_ids):
 				search_ids.remove(article_id)
-				if (ass.find(text=re.compile("The publisher of this article does not allow downloading of the full text in XML form"))):
-					#article isnt open access :(
-					continue
-				#found open access article
-				yield (ass,article_id)
-				if (len(search_ids == 0)):
-					return 0	#all articles found
+				if (not any("The publisher of this article does not allow downloading of the full text in XML form" in text for text in elem.itertext())):
+					#found open access article
+					ass = BeautifulSoup(etree.tostring(elem,with_tail=False),"lxml").find("article")
+					yield (ass,article_id)
+				#else article isnt open access :(
+			#free the article (and anything before it) now that it's been handled
+			elem.clear()
+			while (elem.getprevious() is not None):
+				del elem.getparent()[0]
+			if (len(search_ids) == 0):
+				return 0	#all articles found
 		if (len(search_ids)>0):
 			print("some articles were not found:\n{}".format(search_ids))
 			return -1	#articles not found
 		return 0 		#all articles found
 
+	def get_articles_indexed(self,file,identifier,search_ids):
+		"""
+		Read articles from an xml file in the format of 'pmc_result.xml' using its offset index (see XMLIndex)
+		Args:
+			file 		-- directory where file is located (string)
+			identifier 	-- type of article_id (doi, pmc, pmid, publisher-id) (string)
+			search_ids	-- article ids to return beautifulsoup of (iterable of strings)
+		Return: generator of (beautiful soup object, article_id) tuples for the articles in {search_ids}, in the order they were requested
+			same output as get_articles_xml, but only the requested articles are read and parsed
+			{search_ids} can be a stream of any length: nothing is kept per id (repeated ids are read again, executer drops them beforehand)
+
+		The first call for a file builds its index (one pass over the file, saved as {file}.idx); later calls only seek
+		Example:
+		>>> am = ArticleManager()
+		>>> ge = am.get_articles_indexed("/Users/christian/Desktop/cbmi/reproduce/python/articles/sub_pmc_result.xml","pmid",['23449283','26395541'])
+		>>> next(ge)
+		(<article article-type="research-article" xmlns:mml="http://www.w3.org/1998/Math/MathML" xmlns:xlink="http://www.w3.org/1999/xlink">
+		...
+		</article>, '23449283')
+		"""
+		index = XMLIndex(file)
+		missing = []		#the first {shown} articles not found, the rest are only counted
+		shown = 20
+		not_found = 0
+		with open(file,'rb') as x:
+			for article_id in map(str,search_ids):
+				span = index.find(identifier,article_id)
+				if (not span):
+					not_found += 1
+					if (len(missing) < shown):
+						missing.append(article_id)
+					continue
+				(start,end) = span
+				x.seek(start)
+				raw = x.read(end - start)
+				if (b"The publisher of this article does not allow downloading of the full text in XML form" in raw):
+					#article isnt open access :(
+					continue
+				yield (BeautifulSoup(raw,"lxml").find("article"),article_id)
+		if (not_found):
+			print("{} articles were not found:\n{}{}".format(not_found,missing," ..." if not_found > len(missing) else ""))
+			return -1	#articles not found
+		return 0 		#all articles found
+
 	def enter_redcap(self,entry,record_id):
 		"""
 		Enter entry into redcap
@@ -579,26 +686,15 @@ class ArticleManager(DatabaseManager):
 		entry['record_id'] = '9b7057f5f8894c9c'
 
 		#see redcap api documentation -- https://redcap.wustl.edu/redcap/srvrs/prod_v3_1_0_001/redcap/api/help/
-		from config import config
-		buf = io.BytesIO()
 		data = json.dumps([entry])
 		fields = {
-		    'token': config['api_token'],
 		    'content': 'record',
 		    'format': 'json',
 		    'type': 'flat',
 		    'data': data,
 		}
 
-		ch = pycurl.Curl()
-		ch.setopt(ch.URL, config['api_url'])
-		ch.setopt(ch.HTTPPOST, list(fields.items()))
-		ch.setopt(ch.WRITEFUNCTION, buf.write)
-		ch.perform()
-		ch.close()
-
-		redcap_return = buf.getvalue()
-		buf.close()
+		redcap_return = self.redcap().post(fields)
 		if (re.search(b'error',redcap_return)):
 			if (re.search(b'There were errors with your request',redcap_return)):
 				print("redcap entry failed because an invalid redcap field was present in entry (key that is not a redcap codebook key)")
@@ -625,3 +721,101 @@ class ArticleManager(DatabaseManager):
 				return self.enter_redcap(entry,record_id)
 		self.redcap_return = {"status":"success","count":1}
 		return self.redcap_return
+
+	def enter_redcap_bulk(self,entries,chunk_size=100,auto_number=False):
+		"""
+		Enter many entries into redcap, chunk_size records per request
+		Args: entries -- redcap entries (list of dictionaries where keys are redcap codebook keys, each must include 'record_id')
+		KeywordArgs:
+			chunk_size 	-- how many records to import per request (int)
+			auto_number -- import every entry as a new record numbered by redcap (redcap's forceAutoNumber);
+							the entries' record_ids then only need to be unique within the import, and are what failures are reported under (bool)
+		Return: dictionary of format: {"status":"success" / "fail", "count": number of records imported}
+			status is "fail" if any chunk couldnt be imported
+
+		REDCap rejects an import outright if any value in it fails validation, and reports every failing (record, field) at once
+		When a chunk fails, the failing fields are recorded with record_error, removed from their records,
+		and the chunk is resubmitted one more time (never one request per error, unlike enter_redcap)
+		Bulk imports never ask for user input
+
+		Example:
+		>>> am = ArticleManager()
+		>>> am.enter_redcap_bulk([{'record_id':'40','author_fn':'kurt','author_ln':'vonnegut'},{'record_id':'41','author_fn':'george','author_ln':'lucas'}])
+		{'status': 'success', 'count': 2}
+
+		>>> am.enter_redcap_bulk([{'record_id':'40','author_fn':'john doe','author_ln':'halpert'},{'record_id':'41','author_fn':'george','author_ln':'lucas'}])
+		redcap import failed on record: '40' field: 'author_fn'
+		because: 'The value you provided could not be validated because it does not follow the expected format. Please try again.'
+		retrying import without failing fields
+		{'status': 'success', 'count': 2}
+
+		>>> am.enter_redcap_bulk([{'record_id':'10.1136/amiajnl-2011-000464','author_fn':'kurt'},{'record_id':'10.1093/jamia/ocu002','author_fn':'george'}],auto_number=True)
+		{'status': 'success', 'count': 2}
+		"""
+		result = {"status":"success","count":0}
+		for start in range(0,len(entries),chunk_size):
+			chunk = [dict(entry) for entry in entries[start:start + chunk_size]]
+			(count,fails) = self.import_records(chunk,auto_number)
+			if (fails):
+				print("retrying import without failing fields")
+				for entry in chunk:
+					for field in fails.get(str(entry.get('record_id')),()):
+						entry.pop(field,None)
+				chunk = [entry for entry in chunk if len(entry) > 1]		#drop records left with only a record_id
+				(count,fails) = self.import_records(chunk,auto_number) if chunk else (0,{})
+			if (count is None or fails):
+				result["status"] = "fail"
+				continue
+			result["count"] += count
+		self.redcap_return = result
+		return self.redcap_return
+
+	def import_records(self,records,auto_number=False):
+		"""
+		Post one multi-record import to redcap
+		Called by enter_redcap_bulk
+		Args: records -- redcap entries (list of dictionaries, each with a 'record_id')
+		KeywordArgs: auto_number -- import the records as new records numbered by redcap (bool, see enter_redcap_bulk)
+		Return: (count,fails) tuple
+			count -- number of records redcap imported, or None if the import failed (including when redcap couldnt be reached)
+			fails -- dictionary of format: {record_id: [failing redcap fields]}, empty unless fields failed validation
+		"""
+		#see redcap api documentation -- https://redcap.wustl.edu/redcap/srvrs/prod_v3_1_0_001/redcap/api/help/
+		fields = {
+		    'content': 'record',
+		    'format': 'json',
+		    'type': 'flat',
+		    'data': json.dumps(records),
+		    'returnContent': 'count',
+		}
+		if (auto_number):
+			fields['forceAutoNumber'] = 'true'
+		try:
+			redcap_return = json.loads(self.redcap().post(fields).decode())
+		except IOError as e:
+			#redcap couldnt be reached after all retries, so the chunk is reported as failed instead of ending the run
+			print("redcap import of {} records failed:\n\t{}".format(len(records),e))
+			self.record_error(method='import_records',object_caller='ArticleManager',notes="records: {}\n{}".format(",".join(str(record.get('record_id')) for record in records),e))
+			return (None,{})
+		except ValueError as e:
+			print("redcap import returned a response that couldnt be read:\n\t{}".format(e))
+			self.record_error(method='import_records',object_caller='ArticleManager',notes=str(e))
+			return (None,{})
+		if ('error' not in redcap_return):
+			return (int(redcap_return.get('count',len(records))),{})
+
+		#validation errors come back as lines of: "record_id","field","value","reason"
+		fails = {}
+		for row in csv.reader(str(redcap_return['error']).splitlines()):
+			if (len(row) != 4):
+				continue
+			(record_id,field,value,reason) = row
+			print("redcap import failed on record: '{}' field: '{}'\nbecause: '{}'".format(record_id,field,reason))
+			self.record_error(method='import_records',object_caller='ArticleManager',record_id=record_id,field=field,value=value,notes=reason)
+			fails.setdefault(record_id,[]).append(field)
+		if (not fails):
+			#not a field validation error (for example, a key that is not a redcap codebook key), nothing to strip
+			print("redcap import failed:\n\t{}".format(redcap_return['error']))
+			self.record_error(method='import_records',object_caller='ArticleManager',notes=str(redcap_return['error']))
+			return (None,{})
+		return (None,fails)
@@ -3,15 +3,17 @@
 
 import os, sys, re
 sys.path.append("{0}/Desktop/cbmi/reproduce/python".format(os.environ['HOME']))		#TODO, remove in final version
-import pycurl, json, io
+import json
 from pprint import pprint
 from difflib import get_close_matches
 
-import sqlite3
-from time import strftime,localtime
+import csv
+from time import strftime,localtime,time
 
 from config import config
 #config contains redcap login information
+from RedcapClient import RedcapClient
+from ErrorLogger import ErrorLogger
 
 
 
@@ -27,10 +29,8 @@ class DatabaseManager(object):
 		os				-- https://docs.python.org/3/library/os.html
 		sys				-- https://docs.python.org/3/library/sys.html
 		re				-- https://docs.python.org/3/library/re.html
-		pycurl 			-- http://pycurl.io/docs/latest/index.html
 		pprint 			-- https://docs.python.org/3/library/pprint.html
 		json 			-- https://docs.python.org/3.4/library/json.html
-		io 				-- https://docs.python.org/3/library/io.html
 		csv 			-- https://docs.python.org/3/library/csv.html
 		difflib 		-- https://docs.python.org/2/library/difflib.html
 		sqlite3			-- https://docs.python.org/3/library/sqlite3.html
@@ -38,7 +38,39 @@ class DatabaseManager(object):
 	See documentation for more information
 	"""
 
-	def record_error(self,article_id='',identifier='',record_id='',method='',object_caller='',field='',value='',notes='',time=strftime("%Y-%m-%d %H:%M:%S",localtime())):
+	redcap_client = None 		#shared RedcapClient, see redcap()
+
+	#redcap metadata, loaded once per process, see get_metadata
+	metadata_cache = None
+	field_index = {}
+	metadata_snapshot = os.environ.get('REPEAT_METADATA_SNAPSHOT','')		#optional local json copy of the metadata
+	metadata_ttl = 24 * 60 * 60 										#seconds before the snapshot is refreshed from redcap
+	metadata_keys = ['field_name','form_name','section_header','field_type','field_label','select_choices_or_calculations',
+		'field_note','text_validation_type_or_show_slider_number','text_validation_min','text_validation_max','identifier',
+		'branching_logic','required_field','custom_alignment','question_number','matrix_group_name','matrix_ranking','field_annotation']
+
+	def redcap(self):
+		"""
+		Get the redcap api client for this process
+		One client (and so one pool of keep-alive connections) is shared by every DatabaseManager in a process;
+		a forked worker process gets its own
+		Timeouts and retries can be set with the optional config keys: api_timeout, api_retries, api_backoff
+		Return: RedcapClient object (see RedcapClient for more information)
+
+		Example:
+		>>> dm = DatabaseManager()
+		>>> dm.redcap().post({'content':'metadata','format':'json'})
+		b'[{"field_name":"record_id", ...
+		>>> dm.redcap() is DatabaseManager().redcap()
+		True
+		"""
+		client = DatabaseManager.redcap_client
+		if (client is None or client.pid != os.getpid()):
+			client = RedcapClient(config['api_url'],config['api_token'],timeout=config.get('api_timeout',30),retries=config.get('api_retries',3),backoff=config.get('api_backoff',0.5))
+			DatabaseManager.redcap_client = client
+		return client
+
+	def record_error(self,article_id='',identifier='',record_id='',method='',object_caller='',field='',value='',notes='',time=None):
 		"""
 		Log error into sqlite database
 		KeywordArgs:
@@ -50,11 +82,12 @@ class DatabaseManager(object):
 			field 				-- redcap field whose extraction caused the error (author_ln, analysis_processes_clear, etc)
 			value				-- value of 'field'
 			notes				-- other information, usually error tracebacks from imported modules
-			time				-- timestamp of when the error occurred
+			time				-- timestamp of when the error occurred (defaults to now)
 		All keyword arguments should be type: string
 		Return:
-			0 if error is successfully recorded into the sql database
-			1 if an error occurred while executed the sql insert statement
+			0 once the error is queued for the sql database
+
+		Errors are buffered and written in batches by a long-lived ErrorLogger (see ErrorLogger for when rows are written)
 
 		Example:
 		>>> dm = DatabaseManager()
@@ -63,53 +96,32 @@ class DatabaseManager(object):
 		>>> dm.record_error(article_id='10.1016/j.annemergmed.2013.08.019',identifier='doi',method='xml_load',object_caller='XMLExtractor',field='TheWrongURL.com'notes='Invalid URL 'TheWrongURL.com': No schema supplied. Perhaps you meant http://TheWrongURL.com?')
 		0
 
-		If sqlite3.InterfaceError (invalid type for one of the fields, likely an object when should be a string) occurs, retry by casting all fields to strings
+		Fields that arent a type sqlite3 can store (likely an object when should be a string) are cast to strings
 		>>> datamanager = DatabaseManager()
 		>>> dm.record_error(object=datamanager)
 		0
 		"""
-		conn = sqlite3.connect('errors.db')
-		c = conn.cursor()
-		c.execute("CREATE TABLE IF NOT EXISTS errortable(article_id TEXT, identifier TEXT, record_id TEXT, method TEXT, object TEXT, field TEXT, value TEXT, notes TEXT, datetimestamp TEXT)")
-
 		#if theyre defined in environment variables
-		if ('article_id' and 'identifier' in os.environ):
+		if ('article_id' in os.environ and 'identifier' in os.environ):
 			#if they werent instantiated in keyword args
 			if (not article_id):
 				article_id = os.environ['article_id']
 			if (not identifier):
 				identifier = os.environ['identifier']
+		if (time is None):
+			time = strftime("%Y-%m-%d %H:%M:%S",localtime())
 
-		try:
-			c.execute("INSERT INTO errortable VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?)", (article_id,identifier,record_id,method,object_caller,field,value,notes,time))
-			conn.commit()
-			c.close()
-			conn.close()
-			return 0 		#no errors
-		except sqlite3.InterfaceError as e:
-			try:
-				c.execute("INSERT INTO errortable VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?)", (str(article_id),str(identifier),str(record_id),str(method),str(object_caller),str(field),str(value),str(notes),str(time)))
-				conn.commit()
-				c.close()
-				conn.close()
-				return 0 		#no errors
-			except Exception:
-				sqlfields = ['article_id','identifier','record_id','method','object_caller','field','value','notes','time']
-				error_index = re.search(r'(\d)',str(e)).group(1)
-				self.record_error(method='record_error',object_caller='DatabaseManager',notes="invalid entry for field: '{}'".format(sqlfields[int(error_index)]))
-				return 1 		#errors occurred and couldnt be resolved
-		except Exception as e:
-			self.record_error(method='record_error',object_caller='DatabaseManager',notes="error information from sqlite3: '{}'".format(e))
-			return 1 		#another error occurred
-
-
-	def get_data(self,field):
+		ErrorLogger.get('errors.db').log((article_id,identifier,record_id,method,object_caller,field,value,notes,time))
+		return 0 		#no errors
+
+
+	def get_data(self,*fields):
 		"""
-		Pull data from redcap for a given field
-		Args: field -- redcap codebook key (string)
-		Return: list of dictionaries - each with: record_id, article_doi, {field}
+		Pull data from redcap for the given field(s), in one export
+		Args: fields -- redcap codebook keys (strings)
+		Return: list of dictionaries - each with: record_id, article_doi, and each of {fields}
 			for all redcap entries
-				dictionary contains only record_id and article_doi if {field} is an invalid redcap key
+				dictionary leaves out any of {fields} that is an invalid redcap key
 
 		Example:
 		>>> dm = DatabaseManager()
@@ -126,10 +138,13 @@ class DatabaseManager(object):
 		 {'record_id': '3', 'article_doi': 'doi:10.1093/jamia/ocu002'},
 		 {'record_id': '4', 'article_doi': 'doi:10.1016/j.yebeh.2015.12.022'},
 		 {'record_id': '5', 'article_doi': '10.1007/s00247-015-3519-1'}]
+
+		>>> dm.get_data('reviewer','analysis_processes_clear')[:2]
+		[{'record_id': '1', 'reviewer': '1', 'analysis_processes_clear': '1', 'article_doi': '10.3171/2015.10.JNS151846'},
+		 {'record_id': '2', 'reviewer': '1', 'analysis_processes_clear': '1', 'article_doi': ''}]
 		"""
 
 		#see redcap api documentation -- https://redcap.wustl.edu/redcap/srvrs/prod_v3_1_0_001/redcap/api/help/
-		buf = io.BytesIO()
 		data = {
 		    'token': 'D9FFA77DB83AE7D9E3E92BB0B0CBBFDB',
 		    'content': 'record',
@@ -137,7 +152,6 @@ class DatabaseManager(object):
 		    'type': 'flat',
 		    'fields[0]': 'article_doi',
 		    'fields[1]': 'record_id',
-		    'fields[2]': field,
 		    'rawOrLabel': 'raw',
 		    'rawOrLabelHeaders': 'raw',
 		    'exportCheckboxLabel': 'false',
@@ -145,14 +159,9 @@ class DatabaseManager(object):
 		    'exportDataAccessGroups': 'false',
 		    'returnFormat': 'json'
 		}
-		ch = pycurl.Curl()
-		ch.setopt(ch.URL, 'https://redcap.wustl.edu/redcap/srvrs/prod_v3_1_0_001/redcap/api/')
-		ch.setopt(ch.HTTPPOST, list(data.items()))
-		ch.setopt(ch.WRITEFUNCTION, buf.write)
-		ch.perform()
-		ch.close()
-		records = json.loads(buf.getvalue().decode())
-		buf.close()
+		for (i,field) in enumerate(fields):
+			data['fields[{}]'.format(i + 2)] = field
+		records = json.loads(self.redcap().post(data).decode())
 		return records
 
 	def get_matches(self,redcap,boolean,val):
@@ -218,7 +227,7 @@ class DatabaseManager(object):
 					if (eachdict[redcap].strip() != str(val)):
 						matches.append((eachdict['article_doi'],eachdict['record_id'],eachdict[redcap]))
 		except KeyError as e:
-			print("redcap field: '{}'\nnot found. did you mean: '{}'?\nverify and try again".format(redcap,get_close_matches(redcap,[d['field_name'] for d in self.get_metadata()])))
+			print("redcap field: '{}'\nnot found. did you mean: '{}'?\nverify and try again".format(redcap,get_close_matches(redcap,list(self.get_field_index()))))
 		return matches
 
 	def get_searches(self,redcap,boolean,val):
@@ -277,13 +286,18 @@ class DatabaseManager(object):
 					if not (re.search(str(val),eachdict[redcap].strip(),re.I)):
 						matches.append((eachdict['article_doi'],eachdict['record_id'],eachdict[redcap]))
 		except KeyError as e:
-			print("redcap field: '{}'\nnot found. did you mean: '{}'?\nverify and try again".format(redcap,get_close_matches(redcap,[d['field_name'] for d in self.get_metadata()])))
+			print("redcap field: '{}'\nnot found. did you mean: '{}'?\nverify and try again".format(redcap,get_close_matches(redcap,list(self.get_field_index()))))
 
 		return matches
 
-	def get_metadata(self):
+	def get_metadata(self,refresh=False):
 		"""
 		Query redcap to retrieve study metadata
+		Metadata is only loaded once per process: later calls return the same list
+			if DatabaseManager.metadata_snapshot is set (or the REPEAT_METADATA_SNAPSHOT environment variable), metadata is read from that json file
+			while it is younger than DatabaseManager.metadata_ttl seconds, and the file is rewritten whenever metadata is pulled from redcap
+		See load_data_dictionary to load metadata offline
+		KeywordArgs: refresh -- ignore the cache and snapshot and query redcap (bool)
 		Return: list of dictionaries,
 			each dictionary has fields:
 				 'branching_logic'
@@ -330,25 +344,94 @@ class DatabaseManager(object):
 		]
 		"""
 
-		#see redcap api documentation -- https://redcap.wustl.edu/redcap/srvrs/prod_v3_1_0_001/redcap/api/help/
-		buf = io.BytesIO()
+		if (DatabaseManager.metadata_cache is not None and not refresh):
+			return DatabaseManager.metadata_cache
+		metadata = None
+		if (not refresh):
+			metadata = self.read_metadata_snapshot()
+		if (metadata is None):
+			#see redcap api documentation -- https://redcap.wustl.edu/redcap/srvrs/prod_v3_1_0_001/redcap/api/help/
+			fields = {
+			    'content': 'metadata',
+			    'format': 'json'
+			}
+
+			metadata = json.loads(self.redcap().post(fields).decode())
+			self.write_metadata_snapshot(metadata)
+		return self.set_metadata(metadata)
+
+	def set_metadata(self,metadata):
+		"""
+		Make {metadata} the metadata every DatabaseManager in this process uses, and index it by field_name
+		Args: metadata -- redcap metadata (list of dictionaries, see get_metadata)
+		Return: metadata (unaltered)
+		"""
+		DatabaseManager.metadata_cache = metadata
+		DatabaseManager.field_index = dict((item['field_name'],item) for item in metadata)
+		return metadata
 
-		fields = {
-		    'token': config['api_token'],
-		    'content': 'metadata',
-		    'format': 'json'
-		}
+	def read_metadata_snapshot(self):
+		"""
+		Read metadata from DatabaseManager.metadata_snapshot
+		Return: metadata (list of dictionaries), or None if there is no snapshot or it is older than DatabaseManager.metadata_ttl seconds
+		"""
+		if (not self.metadata_snapshot):
+			return None
+		try:
+			if (time() - os.path.getmtime(self.metadata_snapshot) > self.metadata_ttl):
+				return None
+			with open(self.metadata_snapshot,'r') as f:
+				return json.load(f)
+		except (OSError,ValueError):
+			return None
+
+	def write_metadata_snapshot(self,metadata):
+		if (not self.metadata_snapshot):
+			return
+		try:
+			with open(self.metadata_snapshot,'w') as f:
+				json.dump(metadata,f)
+		except OSError as e:
+			print("couldnt save metadata snapshot: {}\n\t{}".format(self.metadata_snapshot,e))
 
-		ch = pycurl.Curl()
-		ch.setopt(ch.URL, config['api_url'])
-		ch.setopt(ch.HTTPPOST, list(fields.items()))
-		ch.setopt(ch.WRITEFUNCTION, buf.write)
-		ch.perform()
-		ch.close()
+	def load_data_dictionary(self,file):
+		"""
+		Load metadata offline from a redcap data dictionary (one of the DataDictionary/*.csv files)
+		Columns are read by position (redcap always exports them in the same order), so both the api style header (field_name, form_name, ...)
+		and the older header (Variable / Field Name, Form Name, ...) work
+		Args: file -- location of the csv file (string)
+		Return: metadata (list of dictionaries, same format as get_metadata), which later get_metadata calls return
 
-		metadata = json.loads(buf.getvalue().decode())
-		buf.close()
-		return metadata
+		Example:
+		>>> dm = DatabaseManager()
+		>>> dm.load_data_dictionary("DataDictionary/RepeATv06_DataDictionary.csv")[1]
+		{'field_name': 'article_doi', 'form_name': 'publication_overview_and_bibliographic_information', 'section_header': '', 'field_type': 'text', 'field_label': 'Article DOI', ...}
+		"""
+		with open(file,'r',newline='',encoding='utf-8') as f:
+			rows = csv.reader(f)
+			next(rows,None)		#header
+			metadata = [dict(zip(self.metadata_keys,row + [''] * (len(self.metadata_keys) - len(row)))) for row in rows if row]
+		return self.set_metadata(metadata)
+
+	def get_field(self,redcap):
+		"""
+		Look up the metadata of a redcap field
+		Args: redcap -- redcap codebook key (string)
+		Return: the field's metadata (dictionary, see get_metadata), or None if {redcap} isnt a redcap field
+
+		Example:
+		>>> dm = DatabaseManager()
+		>>> dm.get_field('reviewer')['field_type']
+		'dropdown'
+		"""
+		return self.get_field_index().get(redcap)
+
+	def get_field_index(self):
+		"""
+		Return: dictionary of format: {field_name: field metadata} for every redcap field
+		"""
+		self.get_metadata()
+		return DatabaseManager.field_index
 
 	def get_ml_data(self,redcap):
 		"""
@@ -377,17 +460,38 @@ class DatabaseManager(object):
 		in get_ml_data() call not found. did you mean: '['meta_analysis', 'analysis_sw', 'analysis_os']'?
 		verify and try again
 
+		"""
+		return self.get_ml_data_many([redcap]).get(redcap)
+
+	def get_ml_data_many(self,redcaps):
+		"""
+		Query redcap to retrieve data to use in machine learning algorithm for several fields, in one export
+		Args: redcaps -- redcap codebook keys (list of strings)
+		Return: dictionary of format:
+				{redcap: {record_id : redcap value}}
+				(see get_ml_data), fields that arent of field_type yesno are left out
+
+		Example:
+		>>> dm = DatabaseManager()
+		>>> dm.get_ml_data_many(["analysis_processes_clear","data_cleaned_yn"])
+		{'analysis_processes_clear': {'2': True, '39': True, '30': True, '9': False, ...},
+		 'data_cleaned_yn': {'2': False, '39': True, '30': True, '9': False, ...}}
 		"""
 		mldata = {}
-		for item in self.get_metadata():
-			if (item['field_name'] == redcap):
-				if (item['field_type'] != "yesno"):
-					print("get_data called on invalid redcap field: {}\nget_ml_data can only be called on fields of field_type yesno but field type of {} is: '{}'".format(redcap,redcap,item['field_type']))
-					return
-		try:
-			for eachdict in self.get_data(redcap):
-				#mldata[eachdict['record_id'].strip()] = 1 if (eachdict[redcap].strip()=='1') else 0
-				mldata[eachdict['record_id'].strip()] = eachdict[redcap].strip() == '1'
-		except KeyError as e:
-			raise KeyError("redcap field: '{}'\nin get_ml_data() call not found. did you mean: '{}'?\nverify and try again".format(redcap,get_close_matches(redcap,[d['field_name'] for d in self.get_metadata()])))
+		fields = []
+		for redcap in redcaps:
+			item = self.get_field(redcap)
+			if (item and item['field_type'] != "yesno"):
+				print("get_data called on invalid redcap field: {}\nget_ml_data can only be called on fields of field_type yesno but field type of {} is: '{}'".format(redcap,redcap,item['field_type']))
+				continue
+			fields.append(redcap)
+		if (not fields):
+			return mldata
+		records = self.get_data(*fields)
+		for redcap in fields:
+			try:
+				#mldata[redcap][eachdict['record_id'].strip()] = 1 if (eachdict[redcap].strip()=='1') else 0
+				mldata[redcap] = dict((eachdict['record_id'].strip(),eachdict[redcap].strip() == '1') for eachdict in records)
+			except KeyError as e:
+				raise KeyError("redcap field: '{}'\nin get_ml_data() call not found. did you mean: '{}'?\nverify and try again".format(redcap,get_close_matches(redcap,list(self.get_field_index()))))
 		return mldata
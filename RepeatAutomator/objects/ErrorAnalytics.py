@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sqlite3
+from ErrorLogger import ErrorLogger
+
+class ErrorAnalytics(object):
+	"""
+	Query the errortable that DatabaseManager.record_error writes to (errors.db)
+	Report error rates by method / field / object, the articles that failed most, and articles worth retrying
+	Every report is a generator reading rows from sqlite as they're produced, so it works on multi-million-row logs
+
+	Times are strings in the format the errortable stores them: 'YYYY-MM-DD HH:MM:SS' (a prefix such as '2016-08-01' also works)
+
+	Depends on imported modules:
+		sqlite3			-- https://docs.python.org/3/library/sqlite3.html
+	See documentation for more information
+	"""
+
+	groupings = ('method','field','object','identifier')
+	#errors from these methods usually mean the article would extract if run again (network trouble, redcap rejecting a value)
+	retry_methods = ('xml_load','parse_xml','enter_redcap','import_records')
+
+	def __init__(self,database='errors.db'):
+		"""
+		Args: database -- location of the sqlite database (string)
+		Adds the (method, datetimestamp) and article_id indexes to the errortable if it doesnt have them
+		"""
+		self.conn = sqlite3.connect(database)
+		ErrorLogger.create_schema(self.conn)
+
+	def window(self,since,until):
+		"""
+		Build the WHERE clause for a time window
+		Return: (clause,parameters) tuple
+		"""
+		clauses = []
+		params = []
+		if (since):
+			clauses.append("datetimestamp >= ?")
+			params.append(since)
+		if (until):
+			clauses.append("datetimestamp <= ?")
+			params.append(until + "~")		#"~" sorts after every digit, so a prefix like '2016-08-01' includes that whole day
+		return ((" WHERE " + " AND ".join(clauses)) if clauses else "",params)
+
+	def error_rates(self,by='method',since='',until=''):
+		"""
+		Count errors per method, field, object or identifier
+		KeywordArgs:
+			by 		-- column to group by: 'method', 'field', 'object' or 'identifier' (string)
+			since 	-- only count errors at or after this time (string)
+			until 	-- only count errors at or before this time (string)
+		Return: generator of (value, errors, percent of errors in the window, articles affected) tuples, most errors first
+
+		Example:
+		>>> ea = ErrorAnalytics()
+		>>> list(ea.error_rates('method',since='2016-08-01'))
+		[('xml_load', 412, 81.1, 409), ('enter_redcap', 90, 17.7, 61), ('record_error', 6, 1.2, 6)]
+		"""
+		if (by not in self.groupings):
+			raise ValueError("error_rates can group by: {} but was called with: '{}'".format(self.groupings,by))
+		(where,params) = self.window(since,until)
+		total = self.conn.execute("SELECT COUNT(*) FROM errortable" + where,params).fetchone()[0]
+		if (not total):
+			return
+		query = "SELECT {0}, COUNT(*), COUNT(DISTINCT article_id) FROM errortable{1} GROUP BY {0} ORDER BY COUNT(*) DESC".format(by,where)
+		for (value,errors,articles) in self.conn.execute(query,params):
+			yield (value,errors,round(100.0 * errors / total,1),articles)
+
+	def top_articles(self,limit=20,since='',until=''):
+		"""
+		Find the articles with the most errors
+		KeywordArgs:
+			limit 	-- how many articles to return (int)
+			since 	-- only count errors at or after this time (string)
+			until 	-- only count errors at or before this time (string)
+		Return: generator of (article_id, identifier, errors, methods that failed, last error time) tuples, most errors first
+
+		Example:
+		>>> list(ErrorAnalytics().top_articles(2))
+		[('24433938', 'pmid', 14, 'xml_load,parse_xml', '2016-08-02 01:13:09'), ('10.1016/j.burns.2013.12.002', 'doi', 9, 'enter_redcap', '2016-08-02 01:20:44')]
+		"""
+		(where,params) = self.window(since,until)
+		where += (" AND " if where else " WHERE ") + "article_id != ''"
+		query = "SELECT article_id, identifier, COUNT(*), GROUP_CONCAT(DISTINCT method), MAX(datetimestamp) FROM errortable{} GROUP BY article_id, identifier ORDER BY COUNT(*) DESC LIMIT ?".format(where)
+		for row in self.conn.execute(query,params + [int(limit)]):
+			yield row
+
+	def retry_candidates(self,since='',until=''):
+		"""
+		Find articles whose errors came from methods that usually succeed on a second try (see ErrorAnalytics.retry_methods)
+		KeywordArgs:
+			since 	-- only consider errors at or after this time (string)
+			until 	-- only consider errors at or before this time (string)
+		Return: generator of (article_id, identifier, methods that failed, last error time) tuples
+
+		Example:
+		>>> list(ErrorAnalytics().retry_candidates(since='2016-08-01 22:00'))
+		[('24433938', 'pmid', 'xml_load', '2016-08-02 01:13:09')]
+		"""
+		(where,params) = self.window(since,until)
+		where += (" AND " if where else " WHERE ") + "article_id != '' AND method IN ({})".format(", ".join("?" * len(self.retry_methods)))
+		query = "SELECT article_id, identifier, GROUP_CONCAT(DISTINCT method), MAX(datetimestamp) FROM errortable{} GROUP BY article_id, identifier ORDER BY MAX(datetimestamp)".format(where)
+		for row in self.conn.execute(query,params + list(self.retry_methods)):
+			yield row
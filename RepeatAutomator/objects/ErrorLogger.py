@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os, sqlite3
+from time import time
+from multiprocessing.util import Finalize
+
+class ErrorLogger(object):
+	"""
+	Long-lived writer for the errortable of errors.db, used by DatabaseManager.record_error
+	Keeps one connection per process (in WAL mode), buffers rows and writes them in one transaction when:
+		batch_size rows are waiting
+		interval seconds have passed since the last write (checked whenever a row is logged)
+		the process exits (including batch worker processes) or flush is called
+	so a run that logs thousands of errors does a handful of commits instead of one per error
+
+	Depends on imported modules:
+		os				-- https://docs.python.org/3/library/os.html
+		sqlite3			-- https://docs.python.org/3/library/sqlite3.html
+		time			-- https://docs.python.org/3.0/library/time.html
+		multiprocessing -- https://docs.python.org/3/library/multiprocessing.html
+	See documentation for more information
+	"""
+
+	columns = ['article_id','identifier','record_id','method','object','field','value','notes','datetimestamp']
+	schema = [
+		"CREATE TABLE IF NOT EXISTS errortable(article_id TEXT, identifier TEXT, record_id TEXT, method TEXT, object TEXT, field TEXT, value TEXT, notes TEXT, datetimestamp TEXT)",
+		"CREATE INDEX IF NOT EXISTS errortable_method_time ON errortable(method, datetimestamp)",
+		"CREATE INDEX IF NOT EXISTS errortable_article ON errortable(article_id)",
+	]
+	loggers = {}		#(process id, database) -> ErrorLogger
+
+	@classmethod
+	def create_schema(cls,conn):
+		"""
+		Create the errortable and its indexes if they dont exist yet
+		Args: conn -- open connection to the error database (sqlite3.Connection)
+		"""
+		for statement in cls.schema:
+			conn.execute(statement)
+		conn.commit()
+
+	@classmethod
+	def get(cls,database='errors.db'):
+		"""
+		Get the logger for {database} in this process, opening it on first use (a forked process opens its own)
+		Args: database -- location of the sqlite database (string)
+		Return: ErrorLogger object
+
+		Example:
+		>>> el = ErrorLogger.get()
+		>>> el.log(('10.5888/pcd10.120097','doi','40','enter_redcap','ArticleManager','author_ln','$$**Tony Cox__==','could not be validated','2016-08-01 12:00:00'))
+		>>> el.flush()
+		"""
+		key = (os.getpid(),os.path.abspath(database))
+		if (key not in cls.loggers):
+			cls.loggers[key] = cls(database)
+		return cls.loggers[key]
+
+	def __init__(self,database='errors.db',batch_size=100,interval=5.0):
+		self.database = database
+		self.batch_size = batch_size
+		self.interval = interval
+		self.rows = []
+		self.last_flush = time()
+		self.conn = sqlite3.connect(database)
+		self.conn.execute("PRAGMA journal_mode=WAL")
+		self.conn.execute("PRAGMA synchronous=NORMAL")
+		self.create_schema(self.conn)
+		#run at interpreter exit, and also when a multiprocessing worker exits (which skips atexit)
+		Finalize(self,self.close,exitpriority=10)
+
+	def log(self,row):
+		"""
+		Buffer one row of the errortable
+		Args: row -- values for: article_id, identifier, record_id, method, object, field, value, notes, datetimestamp (tuple)
+		Return: void
+		"""
+		self.rows.append(tuple(v if (v is None or isinstance(v,(str,int,float,bytes))) else str(v) for v in row))
+		if (len(self.rows) >= self.batch_size or time() - self.last_flush >= self.interval):
+			self.flush()
+
+	def flush(self):
+		"""
+		Write every buffered row in a single transaction
+		Return: number of rows written (int)
+		"""
+		self.last_flush = time()
+		if (not self.rows or self.conn is None):
+			return 0
+		(rows,self.rows) = (self.rows,[])
+		insert = "INSERT INTO errortable VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?)"
+		try:
+			with self.conn:
+				self.conn.executemany(insert,rows)
+			return len(rows)
+		except sqlite3.Error as e:
+			print("error information from sqlite3: '{}'\nretrying with every field cast to string".format(e))
+		try:
+			with self.conn:
+				self.conn.executemany(insert,[tuple(map(str,row)) for row in rows])
+			return len(rows)
+		except sqlite3.Error as e:
+			print("couldnt record {} errors into: {}\n\t{}".format(len(rows),self.database,e))
+			return 0
+
+	def close(self):
+		if (self.conn is None):
+			return
+		self.flush()
+		self.conn.close()
+		self.conn = None
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os, json, hashlib
+import nltk
+import numpy as np
+
+class ModelArtifact(object):
+	"""
+	Classifier Trainer trained for a yesno redcap field, saved as a json file so extraction can classify articles without retraining
+	The file holds everything classify needs and a record of how the model was made:
+		version 		-- layout of the file (ModelArtifact.version), files of another version are refused
+		field 			-- redcap field the model predicts
+		data_dictionary -- version of the redcap metadata the model was trained against (see data_dictionary_version)
+		training 		-- when and on how many articles the model was trained, and its cross-validation metrics (see Trainer.cross_validate)
+		classes 		-- redcap values the model predicts
+		vocabulary 		-- words used as features
+		bias, weights 	-- Bernoulli naive bayes model (see Trainer.fit)
+	Files are named {field}.json, so a directory of them holds one model per field (see load_all)
+
+	Depends on imported modules:
+		os				-- https://docs.python.org/3/library/os.html
+		json 			-- https://docs.python.org/3.4/library/json.html
+		hashlib			-- https://docs.python.org/3/library/hashlib.html
+		nltk 			-- http://www.nltk.org/
+		numpy 			-- http://www.numpy.org/
+	See documentation for more information
+	"""
+
+	version = 1
+
+	def __init__(self,field,vocabulary,classes,bias,weights,training={},data_dictionary=''):
+		"""
+		Args:
+			field 		-- redcap field the model predicts (string)
+			vocabulary 	-- words used as features (list of strings)
+			classes 	-- redcap values the model predicts (list)
+			bias 		-- score of each class for an article with none of the words (array: classes)
+			weights 	-- score each word adds to each class (array: classes x words)
+		KeywordArgs:
+			training 		-- how the model was trained (dictionary)
+			data_dictionary -- version of the redcap metadata the model was trained against (string)
+
+		Example:
+		>>> model = ModelArtifact.load('models/analysis_processes_clear.json')
+		>>> model.classify("Statistical analyses were performed using SAS 9.1. Data analysis followed the protocol ...")
+		True
+		>>> model.training['cross_validation']['accuracy']
+		0.7833333333333333
+		"""
+		self.field = field
+		self.vocabulary = list(vocabulary)
+		(self.words,self.phrases) = self.get_index(self.vocabulary)
+		self.classes = list(classes)
+		self.bias = np.asarray(bias,dtype=float)
+		self.weights = np.asarray(weights,dtype=float)
+		self.training = training
+		self.data_dictionary = data_dictionary
+
+	@staticmethod
+	def data_dictionary_version(metadata):
+		"""
+		Args: metadata -- redcap metadata (list of dictionaries, see DatabaseManager.get_metadata)
+		Return: short sha256 of the metadata (string), the same for the same fields and choices however the metadata was loaded
+		"""
+		return hashlib.sha256(json.dumps(metadata,sort_keys=True).encode()).hexdigest()[:16]
+
+	@staticmethod
+	def get_index(vocabulary):
+		"""
+		Index the vocabulary for columns
+		Entries with whitespace (searchwords like 'natural language processing') are tokenized the way article text is (nltk.word_tokenize)
+		and matched as a sequence of tokens, every other entry is matched as a single token
+		Args: vocabulary -- words and phrases used as features (list of strings)
+		Return: (words, phrases) tuple
+			words 	-- {token: column}
+			phrases -- {first token: [(tuple of tokens, column)]}
+		"""
+		words = {}
+		phrases = {}
+		for (i,entry) in enumerate(vocabulary):
+			tokens = tuple(nltk.word_tokenize(entry)) if (len(entry.split()) > 1) else (entry,)
+			if (len(tokens) == 1):
+				words.setdefault(tokens[0],i)
+			elif (tokens):
+				phrases.setdefault(tokens[0],[]).append((tokens,i))
+		return (words,phrases)
+
+	@staticmethod
+	def columns(tokens,words,phrases):
+		"""
+		Args:
+			tokens 			-- tokens of an article's text (list of strings)
+			words, phrases 	-- see get_index
+		Return: sorted columns of the vocabulary entries the tokens contain (list of ints)
+		"""
+		found = set(words[token] for token in set(tokens) if token in words)
+		if (phrases):
+			for (i,token) in enumerate(tokens):
+				for (phrase,column) in phrases.get(token,()):
+					if (tuple(tokens[i:i + len(phrase)]) == phrase):
+						found.add(column)
+		return sorted(found)
+
+	@staticmethod
+	def path(directory,field):
+		return os.path.join(directory,"{}.json".format(field))
+
+	def classify(self,text):
+		"""
+		Args: text -- text of an article (string)
+		Return: the redcap value the model predicts for the article, or None if there is no text (textract failed)
+		"""
+		if (not isinstance(text,str)):
+			return None
+		columns = self.columns(nltk.word_tokenize(text),self.words,self.phrases)
+		scores = self.bias + self.weights[:,columns].sum(axis=1)
+		return self.classes[int(scores.argmax())]
+
+	def save(self,path):
+		"""
+		Write the model to {path} (atomically, so a run loading the model never sees a partial file)
+		Return: void
+		"""
+		if (os.path.dirname(path)):
+			os.makedirs(os.path.dirname(path),exist_ok=True)
+		tmp = "{}.{}.tmp".format(path,os.getpid())
+		with open(tmp,'w') as f:
+			json.dump({
+				'version':self.version,
+				'field':self.field,
+				'data_dictionary':self.data_dictionary,
+				'training':self.training,
+				'classes':self.classes,
+				'vocabulary':self.vocabulary,
+				'bias':self.bias.tolist(),
+				'weights':self.weights.tolist(),
+				},f)
+		os.replace(tmp,path)
+
+	@classmethod
+	def load(cls,path):
+		"""
+		Read a model written by save
+		Return: ModelArtifact
+		Raise ValueError if the file was written in another version of the layout
+		"""
+		with open(path,'r') as f:
+			model = json.load(f)
+		if (model.get('version') != cls.version):
+			raise ValueError("model file: '{}' has version: {} but ModelArtifact reads version: {}, retrain the model".format(path,model.get('version'),cls.version))
+		return cls(model['field'],model['vocabulary'],model['classes'],model['bias'],model['weights'],training=model['training'],data_dictionary=model['data_dictionary'])
+
+	@classmethod
+	def load_all(cls,directory,metadata=None):
+		"""
+		Load every model in {directory}
+		Args: directory -- where Trainer saved the models (string)
+		KeywordArgs: metadata -- redcap metadata extraction runs against, to warn about models trained against another version of it
+		Return: dictionary of format: {redcap field: ModelArtifact}
+
+		Example:
+		>>> ModelArtifact.load_all('models',metadata)
+		{'analysis_processes_clear': <ModelArtifact.ModelArtifact object at 0x10a4c3e10>}
+		"""
+		models = {}
+		for name in sorted(os.listdir(directory)):
+			if (not name.endswith('.json')):
+				continue
+			model = cls.load(os.path.join(directory,name))
+			if (metadata is not None and model.data_dictionary != cls.data_dictionary_version(metadata)):
+				print("model for: '{}' was trained against another version of the redcap data dictionary ({}), consider retraining it".format(model.field,model.data_dictionary))
+			models[model.field] = model
+		return models
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import re
+
+class PDFSections(object):
+	"""
+	Split the text textract extracts from a pdf into its sections, so PDFArticle extractors only scan the sections they need
+	(the same lookup XMLArticle.xml_section offers for xml articles)
+
+	textract text has no line breaks left (see RawArticle.get_text), so a heading is recognized by its wording and position:
+		a known heading, Capitalized or in CAPITALS, optionally numbered ('2. Methods') and followed by ':' or '.'
+		at the start of the text or after the end of a sentence, a number or a bracket
+		followed by a word starting with a capital letter or number
+	A section runs from its heading to the next heading
+	Structured abstracts repeat the headings ('Methods: We reviewed ...'), so when a heading occurs more than once the longest section is used
+
+	Depends on imported modules:
+		re				-- https://docs.python.org/3/library/re.html
+	See documentation for more information
+	"""
+
+	HEADINGS = [
+		('abstract',['Abstract','Summary']),
+		('introduction',['Introduction','Background']),
+		('methods',['Materials and Methods','Patients and Methods','Subjects and Methods','Methods','Methodology']),
+		('results',['Results','Findings']),
+		('discussion',['Discussion']),
+		('limitations',['Strengths and Limitations','Study Limitations','Limitations']),
+		('conclusion',['Conclusions','Conclusion']),
+		('references',['References','Bibliography','Literature Cited']),
+		('funding',['Funding','Financial Support','Acknowledgements','Acknowledgments','Acknowledgement','Acknowledgment']),
+		]
+	heading = re.compile(r'(?:^|(?<=[.!?)\]\d]\s))(?:\d{1,2}\.?\s)?(?:' + "|".join(
+		"(?P<{}>{})".format(name,"|".join(alt for each in alternatives for alt in (re.escape(each),re.escape(each.upper()))))
+		for (name,alternatives) in HEADINGS) + r')[:.]?\s+(?=[A-Z\d\[(])')
+
+	def __init__(self,text):
+		"""
+		Args: text -- normalized text of a pdf (string), anything else (textract failed) is kept as is and returned by section
+		Example:
+		>>> ps = PDFSections("Abstract Background: Burns are common. Methods: We reviewed charts. INTRODUCTION Burns are a problem. METHODS Records of 500 patients were abstracted. RESULTS Most were women. References 1. Natarajan M. Burns 2010.")
+		>>> ps.section('methods')
+		'METHODS Records of 500 patients were abstracted. '
+		>>> ps.section('limitations','discussion')
+		'Abstract Background: Burns are common. Methods: We reviewed charts. INTRODUCTION Burns are a problem. METHODS Records of 500 patients were abstracted. RESULTS Most were women. '
+		#neither section was found, so the text before the references is returned
+		"""
+		self.text = text
+		self.sections = {}		#name: text of the longest section with that heading
+		self.body = text
+		if (not isinstance(text,str)):
+			return
+		headings = [(match.start(),match.lastgroup) for match in self.heading.finditer(text)]
+		for ((start,name),(end,next_name)) in zip(headings,headings[1:] + [(len(text),None)]):
+			if (end - start > len(self.sections.get(name,''))):
+				self.sections[name] = text[start:end]
+		references = [start for (start,name) in headings if name == 'references']
+		if (references):
+			self.body = text[:references[-1]]
+
+	def section(self,*names):
+		"""
+		Get the text of the first of {names} the article has a heading for
+		Args: names -- section names, see PDFSections.HEADINGS (strings)
+		Return: text of the section, or the text before the references if the article has none of the sections (string)
+		"""
+		for name in names:
+			if (name in self.sections):
+				return self.sections[name]
+		return self.body
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os, re, gzip, time
+
+class PubmedCache(object):
+	"""
+	On-disk cache of the pubmed xml PubmedFetcher downloads, one gzipped <PubmedArticle> per pmid
+	PubmedFetcher looks here before making any request, so rerunning an extraction on the same articles doesnt touch the network
+	Entries older than ttl seconds are downloaded again (ttl of 0 keeps entries forever)
+	In offline mode nothing is downloaded: every article is read from the cache, however old, and articles that arent cached fail
+
+	Default location is ~/.cache/RepeatAutomator/pubmed, or the directory in the REPEAT_XML_CACHE environment variable
+
+	Depends on imported modules:
+		os				-- https://docs.python.org/3/library/os.html
+		re				-- https://docs.python.org/3/library/re.html
+		gzip			-- https://docs.python.org/3/library/gzip.html
+		time			-- https://docs.python.org/3.0/library/time.html
+	See documentation for more information
+	"""
+
+	def __init__(self,directory='',ttl=0,offline=False):
+		"""
+		KeywordArgs:
+			directory 	-- where to keep the cache (string)
+			ttl 		-- seconds before a cached article is downloaded again, 0 for never (number)
+			offline 	-- only read from the cache, never download (bool)
+
+		Example:
+		>>> pc = PubmedCache(ttl=30*24*60*60)
+		>>> pc.get('24433938')
+		>>> pc.put('24433938','<PubmedArticle><MedlineCitation Status="MEDLINE" Owner="NLM"> ...')
+		>>> pc.get('24433938')
+		'<PubmedArticle><MedlineCitation Status="MEDLINE" Owner="NLM"> ...'
+		>>> pc.report()
+		'pubmed xml cache: 1 hits, 1 misses (~/.cache/RepeatAutomator/pubmed)'
+		"""
+		self.directory = directory or os.environ.get('REPEAT_XML_CACHE') or os.path.join(os.path.expanduser('~'),'.cache','RepeatAutomator','pubmed')
+		self.ttl = ttl
+		self.offline = offline
+		self.hits = self.misses = 0
+
+	def path(self,pmid):
+		pmid = re.sub(r'[^\w\.\-]','_',str(pmid).strip())
+		return os.path.join(self.directory,pmid[-2:],pmid + ".xml.gz")
+
+	def get(self,pmid):
+		"""
+		Look up the xml of an article
+		Args: pmid -- pubmed id of the article (string)
+		Return: cached <PubmedArticle> xml (string), or None if it isnt cached or has expired
+		"""
+		path = self.path(pmid)
+		try:
+			if (self.ttl and not self.offline and time.time() - os.path.getmtime(path) > self.ttl):
+				raise OSError("expired")
+			with gzip.open(path,'rt',encoding='utf-8') as f:
+				text = f.read()
+		except (OSError,EOFError):
+			self.misses += 1
+			return None
+		self.hits += 1
+		return text
+
+	def put(self,pmid,text):
+		"""
+		Store the xml of an article
+		Args:
+			pmid 	-- pubmed id of the article (string)
+			text 	-- <PubmedArticle> xml (string)
+		Return: void
+		"""
+		path = self.path(pmid)
+		try:
+			os.makedirs(os.path.dirname(path),exist_ok=True)
+			tmp = "{}.{}.tmp".format(path,os.getpid())
+			with gzip.open(tmp,'wt',encoding='utf-8') as f:
+				f.write(text)
+			os.replace(tmp,path)		#atomic, so a run reading the cache never sees a partial entry
+		except OSError as e:
+			print("couldnt cache pubmed xml of: {}\n\t{}".format(pmid,e))
+
+	def report(self):
+		return "pubmed xml cache: {} hits, {} misses ({})".format(self.hits,self.misses,self.directory)
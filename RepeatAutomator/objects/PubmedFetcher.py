@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import io, time, threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from lxml import etree
+from config import config
+from DatabaseManager import DatabaseManager
+
+class TokenBucket(object):
+	"""
+	Thread-safe rate limiter: allows {rate} calls per second on average, and bursts of up to {capacity} calls
+	acquire blocks the calling thread until a call is allowed
+	"""
+
+	def __init__(self,rate,capacity=1):
+		self.rate = float(rate)
+		self.capacity = capacity
+		self.tokens = float(capacity)
+		self.last = time.monotonic()
+		self.lock = threading.Lock()
+
+	def acquire(self):
+		while True:
+			with self.lock:
+				now = time.monotonic()
+				self.tokens = min(self.capacity,self.tokens + (now - self.last) * self.rate)
+				self.last = now
+				if (self.tokens >= 1):
+					self.tokens -= 1
+					return
+				wait = (1 - self.tokens) / self.rate
+			time.sleep(wait)
+
+class PubmedFetcher(DatabaseManager):
+	"""
+	Download the pubmed xml of many articles concurrently, using ncbi's e-utilities efetch
+	Each request fetches up to {batch_size} articles; the response is split into one <PubmedArticle> per pmid
+	Requests run on a pool of threads sharing one keep-alive session, and are spaced by a TokenBucket so the run stays under ncbi's limit:
+		3 requests per second, or 10 per second when config has an 'ncbi_api_key'
+	Requests time out, and are retried with exponential backoff on connection errors, timeouts and 429 / 5xx responses (waiting as long as ncbi's Retry-After header asks)
+
+	executer prefetches the xml of a chunk of articles with fetch_all, and passes each article's xml to XMLExtractor.xml_load
+	With a PubmedCache, cached articles are read from disk and only the rest are downloaded (and then cached)
+
+	Depends on imported modules:
+		io				-- https://docs.python.org/3/library/io.html
+		time			-- https://docs.python.org/3.0/library/time.html
+		threading 		-- https://docs.python.org/3/library/threading.html
+		concurrent 		-- https://docs.python.org/3/library/concurrent.futures.html
+		requests		-- http://docs.python-requests.org/en/master/
+		lxml			-- http://lxml.de/
+	Inherited methods from DatabaseManager:
+		record_error
+	See documentation for more information
+	"""
+
+	efetch = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi"
+	site = efetch + "?db=pubmed&retmode=xml&id={}"		#xml of a single article
+	batch_size = 200		#pmids per efetch request (ncbi asks for POST above a couple hundred)
+	retry_statuses = (429,500,502,503,504)
+
+	def __init__(self,workers=4,rate=0,timeout=30,retries=3,backoff=0.5,cache=None):
+		"""
+		KeywordArgs:
+			workers 	-- how many requests to have open at once (int)
+			rate 		-- requests per second (number), defaults to ncbi's limit
+			timeout 	-- seconds to wait for ncbi to connect or respond (number)
+			retries 	-- how many times to retry a failed request (int)
+			backoff 	-- seconds to wait before the first retry, doubled for each retry after (number)
+			cache 		-- PubmedCache to read articles from before downloading them, None to always download
+
+		Example:
+		>>> pf = PubmedFetcher(workers=8)
+		>>> xml = pf.fetch_all(['24433938','not a pmid'])
+		request to site: 'https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi?db=pubmed&retmode=xml&id=not a pmid'
+		failed. error information from requests:
+			 article not found in efetch response
+		>>> xml['24433938'][:60]
+		'<PubmedArticle><MedlineCitation Status="MEDLINE" Owner="NLM"'
+		>>> xml['not a pmid']
+		0
+		"""
+		self.api_key = config.get('ncbi_api_key','')
+		self.workers = workers
+		self.timeout = timeout
+		self.retries = retries
+		self.backoff = backoff
+		self.cache = cache
+		self.bucket = TokenBucket(rate or (10 if self.api_key else 3))
+		self.session = requests.Session()
+		adapter = requests.adapters.HTTPAdapter(pool_connections=1,pool_maxsize=workers)
+		self.session.mount('http://',adapter)
+		self.session.mount('https://',adapter)
+
+	def fetch(self,pmids):
+		"""
+		Request the pubmed xml of a batch of articles from efetch (safe to call from several threads at once)
+		Args: pmids -- pubmed ids, at most {batch_size} (list of strings)
+		Return: body of ncbi's response, a <PubmedArticleSet> (bytes)
+		Raise IOError if ncbi couldnt be reached after all retries
+		"""
+		data = {'db':'pubmed','retmode':'xml','id':",".join(pmids)}
+		if (self.api_key):
+			data['api_key'] = self.api_key
+		error = ''
+		wait = 0
+		for attempt in range(self.retries + 1):
+			if (attempt):
+				time.sleep(max(wait,self.backoff * 2 ** (attempt - 1)))
+			self.bucket.acquire()
+			try:
+				response = self.session.post(self.efetch,data=data,timeout=self.timeout)
+			except (requests.ConnectionError,requests.Timeout) as e:
+				error = str(e)
+				continue
+			if (response.status_code in self.retry_statuses):
+				error = "ncbi responded with status: {}".format(response.status_code)
+				retry_after = response.headers.get('Retry-After','')
+				wait = int(retry_after) if retry_after.isdigit() else 0
+				continue
+			if (response.status_code != 200):
+				raise IOError("ncbi responded with status: {}\n\t{}".format(response.status_code,response.text[:200]))
+			return response.content
+		raise IOError("failed after {} attempts\n\t{}".format(self.retries + 1,error))
+
+	def split(self,content):
+		"""
+		Split an efetch response into its articles
+		Args: content -- <PubmedArticleSet> xml (bytes)
+		Return: dictionary of format: {pmid: <PubmedArticle> xml (string)}
+		"""
+		articles = {}
+		for (event,elem) in etree.iterparse(io.BytesIO(content),tag='PubmedArticle'):
+			pmid = elem.findtext('MedlineCitation/PMID')
+			if (pmid):
+				articles[pmid.strip()] = etree.tostring(elem,encoding='unicode',with_tail=False)
+			elem.clear()
+		return articles
+
+	def fetch_batch(self,pmids):
+		try:
+			return (self.split(self.fetch(pmids)),None)
+		except (IOError,requests.RequestException,etree.XMLSyntaxError) as e:
+			return ({},e)
+
+	def fetch_all(self,pmids):
+		"""
+		Download the pubmed xml of many articles, {batch_size} per request with up to {workers} requests at once
+		Args: pmids -- pubmed ids (iterable of strings)
+		Return: dictionary of format: {pmid: <PubmedArticle> xml (string)}, xml is 0 for articles that couldnt be downloaded (the error is recorded)
+		"""
+		xml = {}
+		pmids = list(dict.fromkeys(pmids))
+		if (self.cache is not None):
+			for pmid in pmids:
+				text = self.cache.get(pmid)
+				if (text is not None):
+					xml[pmid] = text
+			pmids = [pmid for pmid in pmids if pmid not in xml]
+		if (self.cache is not None and self.cache.offline):
+			results = [({},"article not in pubmed xml cache (offline)")]
+			batches = [pmids]
+		else:
+			batches = [pmids[i:i + self.batch_size] for i in range(0,len(pmids),self.batch_size)]
+			with ThreadPoolExecutor(max_workers=self.workers) as pool:
+				results = list(pool.map(self.fetch_batch,batches))
+		for (batch,(articles,e)) in zip(batches,results):
+			for pmid in batch:
+				xml[pmid] = articles.get(pmid,0)
+				if (xml[pmid]):
+					if (self.cache is not None):
+						self.cache.put(pmid,xml[pmid])
+					continue
+				#errors are recorded here, in the calling thread, because the error database connection cant be shared across threads
+				notes = str(e) if e is not None else "article not found in efetch response"
+				site = self.site.format(pmid)
+				self.record_error(article_id=pmid,identifier='pmid',method='xml_load',object_caller='PubmedFetcher',field=site,notes=notes)
+				print("request to site: '{}'\nfailed. error information from requests:".format(site))
+				print("\t",notes)
+		return xml
+
+	def close(self):
+		self.session.close()
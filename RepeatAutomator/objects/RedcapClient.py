@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os, time
+import requests
+
+class RedcapClient(object):
+	"""
+	Reusable connection to the redcap api
+	Keeps a pool of keep-alive connections open (so repeated calls dont pay for a new TLS handshake),
+	times out stalled requests and retries with exponential backoff when redcap is unreachable or overloaded
+
+	DatabaseManager.redcap() hands out one RedcapClient per process; every redcap call (get_data, get_metadata, enter_redcap) goes through it
+	The url is a plain argument, so the client can be pointed at a local stand-in server
+
+	Depends on imported modules:
+		os				-- https://docs.python.org/3/library/os.html
+		time			-- https://docs.python.org/3.0/library/time.html
+		requests 		-- http://docs.python-requests.org/en/master/
+	See documentation for more information
+	"""
+
+	retry_statuses = (429,500,502,503,504)
+
+	def __init__(self,url,token,timeout=30,retries=3,backoff=0.5,pool_size=4):
+		"""
+		Args:
+			url 		-- redcap api url (string)
+			token 		-- redcap api token, sent with every request that doesnt provide its own (string)
+		KeywordArgs:
+			timeout 	-- seconds to wait for redcap to connect or respond (number)
+			retries 	-- how many times to retry a request that failed to connect, timed out, or got a 429 / 5xx response (int)
+			backoff 	-- seconds to wait before the first retry, doubled for each retry after (number)
+			pool_size	-- how many connections to keep open (int)
+
+		Example:
+		>>> rc = RedcapClient("http://localhost:8080/api/","D9FFA77DB83AE7D9E3E92BB0B0CBBFDB",timeout=5)
+		>>> rc.post({'content':'metadata','format':'json'})
+		b'[{"field_name":"record_id","form_name":"publication_overview_and_bibliographic_information", ...
+		"""
+		self.url = url
+		self.token = token
+		self.timeout = timeout
+		self.retries = retries
+		self.backoff = backoff
+		self.pid = os.getpid()		#connections cant be shared with forked processes
+		self.session = requests.Session()
+		adapter = requests.adapters.HTTPAdapter(pool_connections=1,pool_maxsize=pool_size)
+		self.session.mount('http://',adapter)
+		self.session.mount('https://',adapter)
+
+	def post(self,fields):
+		"""
+		Post a request to the redcap api
+		Args: fields -- api parameters (dictionary), see redcap api documentation -- https://redcap.wustl.edu/redcap/srvrs/prod_v3_1_0_001/redcap/api/help/
+		Return: body of redcap's response (bytes)
+			validation errors (4xx other than 429) are returned, not raised, so callers can read redcap's error message
+		Raise IOError if redcap couldnt be reached after all retries
+
+		Example:
+		>>> rc.post({'content':'record','format':'json','type':'flat','data':'[{"record_id":"40","author_fn":"kurt"}]'})
+		b'{"count": 1}'
+		"""
+		data = dict(fields)
+		data.setdefault('token',self.token)
+		error = ''
+		for attempt in range(self.retries + 1):
+			if (attempt):
+				time.sleep(self.backoff * 2 ** (attempt - 1))
+			try:
+				response = self.session.post(self.url,data=data,timeout=self.timeout)
+			except (requests.ConnectionError,requests.Timeout) as e:
+				error = str(e)
+				continue
+			if (response.status_code in self.retry_statuses):
+				error = "redcap responded with status: {}".format(response.status_code)
+				continue
+			return response.content
+		raise IOError("request to redcap: '{}' failed after {} attempts\n\t{}".format(self.url,self.retries + 1,error))
+
+	def close(self):
+		self.session.close()
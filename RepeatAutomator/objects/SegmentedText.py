@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import nltk
+
+class SegmentedText(object):
+	"""
+	Text of an article (or a section of an article) split into sentences once
+	Every ArticleExtractor._get_* method reads sentences from here instead of running nltk.sent_tokenize again
+
+	Depends on imported modules:
+		nltk 			-- http://www.nltk.org/
+	See documentation for more information
+	"""
+
+	def __init__(self,text):
+		"""
+		Args: text -- text from the article to be segmented (string)
+
+		Raise TypeError when text is not a string (same as nltk.sent_tokenize), which executer relies on to detect missing pdfs
+		>>> SegmentedText(0)
+		TypeError: SegmentedText called on: '0'
+		invalid type: <class 'int'>
+		"""
+		if (not isinstance(text,str)):
+			raise TypeError("SegmentedText called on: '{}'\ninvalid type: {}".format(text,type(text)))
+		self.text = text
+		self.sentences = nltk.sent_tokenize(text)
+		self.offsets = self.get_offsets()
+
+	def get_offsets(self):
+		"""
+		Locate each sentence in the original text
+		Return: list of (start,end) tuples, one per sentence, such that text[start:end] == sentence
+
+		Example:
+		>>> st = SegmentedText("Data were abstracted. SAS was used.")
+		>>> st.sentences
+		['Data were abstracted.', 'SAS was used.']
+		>>> st.offsets
+		[(0, 21), (22, 35)]
+		"""
+		offsets = []
+		pos = 0
+		for sent in self.sentences:
+			start = self.text.find(sent,pos)
+			if (start == -1):
+				#punkt normalized the sentence (rare), fall back to where the previous sentence ended
+				start = pos
+			end = start + len(sent)
+			offsets.append((start,end))
+			pos = end
+		return offsets
+
+	def __iter__(self):
+		return iter(self.sentences)
+
+	def __len__(self):
+		return len(self.sentences)
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import re
+
+class SentenceScanner(object):
+	"""
+	Find every sentence that triggers an ArticleExtractor rule, scanning the text's sentences once
+
+	Most sentences trigger no rule, so each sentence is first lowercased once and checked for the literal words in ANCHORS
+	(plain substring checks, far cheaper than a regex search); only the rules whose anchor the sentence contains
+	run their trigger pattern, compiled once, to confirm the match
+	ArticleExtractor._get_* methods then only visit the sentences their rule was triggered by (see ArticleExtractor.triggered)
+
+	To add a rule, add a (name, pattern) pair to TRIGGERS; patterns are case insensitive unless scoped with (?-i:...)
+	and, optionally, ANCHORS[name]: lowercase words at least one of which every match of the pattern contains
+	(a rule without anchors runs its pattern on every sentence)
+
+	Depends on imported modules:
+		re				-- https://docs.python.org/3/library/re.html
+	See documentation for more information
+	"""
+
+	TRIGGERS = [
+		('hypothesis',	r'we.*?hypothes'),
+		('funding',		r'(?s:funded.*?by)'),
+		('inclusion',	r'were\W*includ|were\W*exclud|inclus|^(?![\s\S]*exclusively)[\s\S]*?exclus'),		#'exclus' only counts in sentences without 'exclusively'
+		('database',	r'database'),
+		('query',		r'abstracted|manual|query|(?s:records.*?review|review.*?records)'),
+		('nlp',			r'language\spro|\snlp\s'),
+		('stats',		r'analys'),
+		('standards',	r'(?-i:STATA|SAS|SPSS)|(?s:analys.*?(?-i:\sR\s)|(?-i:\sR\s).*?analys)'),
+		('limitations',	r'shortcomings|limitation| limited'),
+		('keywords',	r'key.*?words'),
+	]
+
+	ANCHORS = {
+		'hypothesis':	('hypothes',),
+		'funding':		('funded',),
+		'inclusion':	('includ','exclud','inclus','exclus'),
+		'database':		('database',),
+		'query':		('abstracted','manual','query','records'),
+		'nlp':			('language','nlp'),
+		'stats':		('analys',),
+		'standards':	('stata','sas','spss','analys'),
+		'limitations':	('shortcomings','limit'),
+		'keywords':		('words',),
+	}
+
+	rules = [(name,anchors,re.compile(trigger,re.I)) for ((name,trigger),anchors) in zip(TRIGGERS,map(ANCHORS.get,dict(TRIGGERS)))]		#ANCHORS looked up outside the comprehension, class attributes arent in its scope
+
+	@classmethod
+	def scan(cls,sentences,names=None):
+		"""
+		Find the sentences that trigger each rule
+		Args: sentences -- sentences of the text being extracted (iterable of strings, usually a SegmentedText)
+		KeywordArgs: names -- rules to scan for (list of rule names), None for every rule in TRIGGERS
+		Return: dictionary of format: {rule name: [sentences that triggered the rule, in order]}
+			every requested rule is a key, even if no sentence triggered it
+
+		Example:
+		>>> SentenceScanner.scan(["We hypothesized that SAS was limited.","Patients were excluded."])
+		{'hypothesis': ['We hypothesized that SAS was limited.'],
+		 'funding': [],
+		 'inclusion': ['Patients were excluded.'],
+		 ...
+		 'standards': ['We hypothesized that SAS was limited.'],
+		 'limitations': ['We hypothesized that SAS was limited.'],
+		 'keywords': []}
+		>>> SentenceScanner.scan(["We hypothesized that SAS was limited.","Patients were excluded."],['inclusion'])
+		{'inclusion': ['Patients were excluded.']}
+		"""
+		rules = cls.rules if names is None else [rule for rule in cls.rules if rule[0] in names]
+		hits = dict((name,[]) for (name,anchors,pattern) in rules)
+		for each_sent in sentences:
+			lowered = each_sent.lower()
+			for (name,anchors,pattern) in rules:
+				if (anchors is not None and not any(anchor in lowered for anchor in anchors)):
+					continue
+				if (pattern.search(each_sent)):
+					hits[name].append(each_sent)
+		return hits
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os, hashlib
+import textract
+
+class TextCache(object):
+	"""
+	On-disk cache of the normalized text textract extracts from a pdf
+	Entries are keyed by the sha256 of the pdf's contents and the textract version, so an unchanged pdf is never parsed twice
+	(even if it's renamed or moved) and upgrading textract invalidates every entry
+	When the cache grows past max_bytes, the least recently used entries are removed until it is back under {low_water} of max_bytes
+	The size of the cache is counted once (on the first put) and then kept as a running total, so the directory is only walked again when evicting
+
+	Default location is ~/.cache/RepeatAutomator/text, or the directory in the REPEAT_TEXT_CACHE environment variable
+
+	Depends on imported modules:
+		os				-- https://docs.python.org/3/library/os.html
+		hashlib			-- https://docs.python.org/3/library/hashlib.html
+		textract        -- http://textract.readthedocs.io/en/latest/python_package.html
+	See documentation for more information
+	"""
+
+	low_water = 0.9
+
+	def __init__(self,directory='',max_bytes=512*1024*1024):
+		self.directory = directory or os.environ.get('REPEAT_TEXT_CACHE') or os.path.join(os.path.expanduser('~'),'.cache','RepeatAutomator','text')
+		self.max_bytes = max_bytes
+		self.version = str(getattr(textract,'VERSION',getattr(textract,'__version__','')))
+		self.total = None 		#bytes in the cache, estimated: counted by the first put, then added to by every put (see evict)
+
+	def key(self,file):
+		"""
+		Content address of a pdf
+		Args: file -- path to the pdf (string)
+		Return: hex digest of the pdf contents and the textract version (string)
+		Raise OSError if the file cant be read
+		"""
+		sha = hashlib.sha256(self.version.encode())
+		with open(file,'rb') as f:
+			for block in iter(lambda: f.read(1 << 20),b''):
+				sha.update(block)
+		return sha.hexdigest()
+
+	def path(self,key):
+		return os.path.join(self.directory,key[:2],key + ".txt")
+
+	def get(self,file,key=None):
+		"""
+		Look up the text of a pdf
+		Args: file -- path to the pdf (string)
+		KeywordArgs: key -- key(file), if the caller already computed it (pass it on to put on a miss, so the pdf is hashed once)
+		Return: cached text (string), or None if the pdf hasnt been cached (or cant be read)
+
+		Example:
+		>>> tc = TextCache()
+		>>> tc.get("/Users/christian/Desktop/cbmi/reproduce/python/articles/21411379.pdf")
+		>>> tc.put("/Users/christian/Desktop/cbmi/reproduce/python/articles/21411379.pdf","Background: ...")
+		>>> tc.get("/Users/christian/Desktop/cbmi/reproduce/python/articles/21411379.pdf")
+		'Background: ...'
+		"""
+		try:
+			path = self.path(key or self.key(file))
+			with open(path,'r',encoding='utf-8') as f:
+				text = f.read()
+			os.utime(path)		#mark as recently used
+			return text
+		except OSError:
+			return None
+
+	def put(self,file,text,key=None):
+		"""
+		Store the text of a pdf, then evict least recently used entries if the cache is too large
+		Args:
+			file 	-- path to the pdf (string)
+			text 	-- normalized text of the pdf (string)
+		KeywordArgs: key -- key(file), if the caller already computed it
+		Return: void
+		"""
+		if (self.total is None):
+			self.total = self.size()
+		try:
+			path = self.path(key or self.key(file))
+			os.makedirs(os.path.dirname(path),exist_ok=True)
+			tmp = "{}.{}.tmp".format(path,os.getpid())
+			with open(tmp,'w',encoding='utf-8') as f:
+				f.write(text)
+			os.replace(tmp,path)		#atomic, so parallel workers never read a partial entry
+			self.total += os.path.getsize(path)
+		except OSError as e:
+			print("couldnt cache text of: {}\n\t{}".format(file,e))
+			return
+		if (self.total > self.max_bytes):
+			self.evict()
+
+	def entries(self):
+		"""
+		Return: list of (last used, size, path) tuples for every entry in the cache
+		"""
+		entries = []
+		for (root,dirs,files) in os.walk(self.directory):
+			for name in files:
+				if (not name.endswith(".txt")):
+					continue
+				try:
+					stat = os.stat(os.path.join(root,name))
+				except OSError:
+					continue
+				entries.append((stat.st_mtime,stat.st_size,os.path.join(root,name)))
+		return entries
+
+	def size(self):
+		return sum(size for (mtime,size,path) in self.entries())
+
+	def evict(self):
+		"""
+		Remove least recently used entries until the cache is no larger than {low_water} of max_bytes
+		Recounts the cache, so the running total is corrected for entries other processes added or removed
+		Return: void
+		"""
+		entries = self.entries()
+		self.total = sum(size for (mtime,size,path) in entries)
+		if (self.total <= self.max_bytes):
+			return
+		for (mtime,size,path) in sorted(entries):
+			try:
+				os.remove(path)
+			except OSError:
+				continue
+			self.total -= size
+			if (self.total <= self.max_bytes * self.low_water):
+				return
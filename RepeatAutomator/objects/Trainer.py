@@ -2,77 +2,331 @@
 # -*- coding: utf-8 -*-
 
 from Article import RawArticle
+from ArticleExtractor import ArticleExtractor
 from DatabaseManager import DatabaseManager
+from ModelArtifact import ModelArtifact
 import json
 import nltk
 from pprint import pprint
-import random
-import re
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+import numpy as np
+from scipy import sparse
 
 
+def fit(feature_counts,class_counts,alpha=0.5):
+	"""
+	Fit a Bernoulli naive bayes model from count tables
+	Args:
+		feature_counts 	-- number of articles of each class that contain each word (array: classes x words)
+		class_counts 	-- number of articles of each class (array: classes)
+		alpha 			-- smoothing added to every count (0.5 is the expected likelihood estimate nltk's NaiveBayesClassifier uses)
+	Return: (bias, weights) tuple, the score of class c for an article x (0/1 per word) is: bias[c] + x . weights[c]
+	"""
+	p = (feature_counts + alpha) / (class_counts[:,None] + 2 * alpha)
+	prior = np.log((class_counts + alpha) / (class_counts.sum() + len(class_counts) * alpha))
+	weights = np.log(p) - np.log1p(-p)
+	bias = prior + np.log1p(-p).sum(axis=1)
+	return (bias,weights)
+
+def predict(matrix,bias,weights):
+	"""
+	Args: matrix -- 0/1 document-term matrix of the articles to classify (scipy.sparse matrix: articles x words)
+	Return: index of the most likely class of each article (array)
+	"""
+	return np.asarray(matrix @ weights.T + bias).argmax(axis=1)
+
+def evaluate_fold(job):
+	#run in a worker process by Trainer.cross_validate: train on every fold but one, predict the held out fold
+	(matrix,feature_counts,class_counts,alpha) = job
+	return predict(matrix,*fit(feature_counts,class_counts,alpha))
+
 
 class Trainer(object):
-	#cant do redcap as *redcap because text to be searched could be from methods, discussion, etc
-	def __init__(self,redcap,directory,articles,searchwords=[]):
+	"""
+	Train a classifier for each of one or more yesno redcap fields on the text of the articles
+
+	However many fields are trained, each article is extracted and tokenized once (get_tokens), the vocabulary is counted once (get_vocabulary),
+	the articles become one binary document-term matrix (get_matrix): one row per article, one column per vocabulary word (or searchword phrase),
+	1 where the article contains the word, and the redcap values of every field come from one redcap export (DatabaseManager.get_ml_data_many)
+	Each field is then trained on the rows of the articles that have a value for it (train)
+
+	The classifier is a Bernoulli naive bayes model, evaluated with (stratified) k-fold cross-validation (cross_validate):
+	word counts of each class are tallied once per fold, so the model for a fold is the totals minus that fold's counts,
+	and folds are evaluated in parallel on {workers} processes (one pool shared by every field)
+	Finally the model is trained on every article (get_model) and, given a models directory, saved there as a ModelArtifact
+	that executer --models loads to classify articles during extraction
+
+	Depends on imported modules:
+		json 			-- https://docs.python.org/3.4/library/json.html
+		nltk 			-- http://www.nltk.org/
+		numpy 			-- http://www.numpy.org/
+		scipy 			-- https://docs.scipy.org/doc/scipy/reference/sparse.html
+	See documentation for more information
+	"""
+
+	pubmed_file = "/Users/christian/Desktop/cbmi/reproduce/python/MedicalResearchTool/otherthings/pubmed.json"		#{article: {'record': redcap record_id}}
+
+	def __init__(self,redcap,directory,articles,searchwords=[],folds=10,workers=1,models=''):
+		"""
+		Args:
+			redcap 		-- yesno redcap field(s) to train on (string or list of strings)
+			directory 	-- where the article pdfs are (string)
+			articles 	-- articles to train on, see pubmed_file (list of strings)
+		KeywordArgs:
+			searchwords -- words to choose the vocabulary from, instead of the words of the articles (list of strings)
+							a searchword with spaces is a phrase, found where its tokens appear in a row (see ModelArtifact.get_index)
+			folds 		-- number of cross-validation folds (int)
+			workers 	-- number of processes to evaluate folds on (int)
+			models 		-- directory to save the trained models in, as {redcap}.json (string), '' to not save them
+
+		Example:
+		>>> tr = Trainer(['analysis_processes_clear','data_cleaned_yn'],'/Users/christian/Desktop/cbmi/reproduce/python/articles',articles,folds=5,workers=4,models='models')
+		training
+		analysis_processes_clear: 5-fold cross-validation on 60 articles
+			accuracy: 0.783 (fold accuracy: 0.783 +/- 0.07)
+			class 		precision 	recall
+			False 		1 		0.35
+			True 		0.755 		1
+			confusion matrix (rows: redcap value, columns: predicted)
+			[[ 7 13]
+			 [ 0 40]]
+		saved model: models/analysis_processes_clear.json
+		data_cleaned_yn: 5-fold cross-validation on 60 articles
+		...
+		saved model: models/data_cleaned_yn.json
+		>>> tr.models['analysis_processes_clear'].classify("Statistical analyses were performed using SAS 9.1 ...")
+		True
+		"""
+		self.fields = [redcap] if isinstance(redcap,str) else list(redcap)
 		self.articles = articles
 		self.directory = directory
-		ml_data = DatabaseManager().get_ml_data(redcap)
+		self.folds = folds
+		self.workers = workers
+		self.metrics = {}		#{redcap field: cross-validation metrics}
+		self.models = {}		#{redcap field: ModelArtifact}
+		ml_data = DatabaseManager().get_ml_data_many(self.fields)
+		self.tokens = self.get_tokens()
 		if (not searchwords):
 			self.allwords = self.get_allwords()
 		else:
 			self.allwords = searchwords
-		self.train(redcap,ml_data)
+		self.vocabulary = self.get_vocabulary(self.allwords)
+		print("training")
+		(self.matrix,self.rows,self.records) = self.get_matrix()
+		with self.pool() as pool:
+			for field in self.fields:
+				if (field not in ml_data):
+					continue
+				self.train(field,ml_data[field],pool)
+				if (models and field in self.models):
+					self.models[field].save(ModelArtifact.path(models,field))
+					print("saved model: {}".format(ModelArtifact.path(models,field)))
 
-	def get_allwords(self):
-		allwords = []
+	def get_tokens(self):
+		"""
+		Extract the text of every article and tokenize it, once
+		Return: OrderedDict of format: {article: list of tokens}, articles that couldnt be found are left out
+		"""
+		tokens = OrderedDict()
 		for each_article in self.articles:
 			art = RawArticle("{}/{}".format(self.directory,each_article))
+
+			#art = XMLArticle(ArticleManager().read_xml(file,identifier,each_article),1,each_article,identifier,metadata=metadata)
+			#ex: art = XMLArticle(ArticleManager().read_xml('articles/sub_pmc_resul.xml','pmid',26781389),1,26781389,'pmid')
+			#example of how Trainer could be applied to xml articles
+
 			try:
-				allwords.extend([word for word in nltk.word_tokenize(art.text) if word not in nltk.corpus.stopwords.words('english')])
+				tokens[each_article] = nltk.word_tokenize(art.text)
 			except TypeError as e:
 				#article not found
 				pass
+		return tokens
 
-			#xmltext = ArticleManager().read_xml(file,identifier,each_article)
-			#allwords.extend([word for word in nltk.word_tokenize(xmltext.text) if word not in nltk.corpus.stopwords.words('english')])
-			#example of how Trainer could be used on xml articles
+	def get_allwords(self):
+		stopwords = ArticleExtractor.get_stopwords()
+		return [word for tokens in self.tokens.values() for word in tokens if word not in stopwords]
 
-		return allwords
+	def get_vocabulary(self,words):
+		"""
+		Choose the words used as features: the most frequent two thirds of the distinct words
+		Args: words -- every word of the corpus, repeated as often as it occurs (list of strings)
+		Return: list of words, most frequent first
+		"""
+		counts = Counter(words)
+		return [word for (word,count) in counts.most_common(int(len(counts)/1.5))]
 
-	def train(self,redcap,ml_data):
-		print("training")
-		pubmed = json.loads(open("/Users/christian/Desktop/cbmi/reproduce/python/MedicalResearchTool/otherthings/pubmed.json").read())
-		train = []
-		featuresset = []
+	def get_matrix(self):
+		"""
+		Build the document-term matrix of the articles that have a redcap record (see pubmed_file)
+		Return: (matrix, rows, records) tuple
+			matrix 	-- scipy.sparse.csr_matrix of 0/1, one row per article and one column per word of self.vocabulary
+			rows 	-- article of each row (list)
+			records -- redcap record_id of each row (list of strings)
+		"""
+		pubmed = json.loads(open(self.pubmed_file).read())
+		(words,phrases) = ModelArtifact.get_index(self.vocabulary)
+		indptr = [0]
+		indices = []
+		rows = []
+		records = []
+		for (each_article,tokens) in self.tokens.items():
+			try:
+				record = str(pubmed[each_article]['record'])
+			except (KeyError,TypeError):
+				print("couldnt find article with record_id: {}".format(each_article))
+				continue
+			indices.extend(ModelArtifact.columns(tokens,words,phrases))
+			indptr.append(len(indices))
+			rows.append(each_article)
+			records.append(record)
+		matrix = sparse.csr_matrix((np.ones(len(indices),dtype=np.int8),indices,indptr),shape=(len(rows),len(self.vocabulary)))
+		return (matrix,rows,records)
 
+	@contextmanager
+	def pool(self):
+		"""
+		Pool of {workers} processes to evaluate cross-validation folds on, shared by every field; None (evaluate in this process) for a single worker
+		"""
+		if (self.workers > 1):
+			with ProcessPoolExecutor(max_workers=self.workers) as pool:
+				yield pool
+		else:
+			yield None
 
-		for each_article in self.articles:
-			art = RawArticle("{}/{}".format(self.directory,each_article))
+	def get_classes(self,labels):
+		"""
+		Args: labels -- redcap value of each row (list)
+		Return: (classes, y) tuple
+			classes -- distinct redcap values of labels, sorted (list)
+			y 		-- index in classes of each row's redcap value (array)
+		"""
+		classes = sorted(set(labels),key=str)
+		return (classes,np.array([classes.index(label) for label in labels],dtype=int))
 
-			#art = XMLArticle(ArticleManager().read_xml(file,identifier,each_article),1,each_article,identifier,metadata=metadata)
-			#ex: art = XMLArticle(ArticleManager().read_xml('articles/sub_pmc_resul.xml','pmid',26781389),1,26781389,'pmid')
-			#example of how Trainer could be applied to xml articles
+	def get_folds(self,y,folds,stratified=True,seed=0):
+		"""
+		Assign every row of the matrix to a fold
+		Args: y -- class index of each row (array)
+		KeywordArgs:
+			folds 		-- number of folds (int)
+			stratified 	-- give every fold the same share of each class (bool)
+			seed 		-- seed of the shuffle (int), so runs are repeatable
+		Return: fold of each row (array)
+		"""
+		random = np.random.RandomState(seed)
+		fold = np.zeros(len(y),dtype=int)
+		groups = [np.flatnonzero(y == c) for c in np.unique(y)] if stratified else [np.arange(len(y))]
+		offset = 0
+		for rows in groups:
+			rows = random.permutation(rows)
+			fold[rows] = (offset + np.arange(len(rows))) % folds
+			offset += len(rows)
+		return fold
 
+	def cross_validate(self,matrix,labels,folds=10,stratified=True,pool=None,alpha=0.5):
+		"""
+		k-fold cross-validation of a Bernoulli naive bayes classifier
+		Args:
+			matrix 	-- document-term matrix of the articles (scipy.sparse matrix, see get_matrix)
+			labels 	-- redcap value of each row of matrix (list)
+		KeywordArgs:
+			folds 		-- number of folds, at most one per article (int)
+			stratified 	-- give every fold the same share of each redcap value (bool)
+			pool 		-- ProcessPoolExecutor to evaluate folds on, None to evaluate them in this process (see Trainer.pool)
+			alpha 		-- smoothing (number), see fit
+		Return: dictionary of metrics:
+			{'articles': int, 'folds': int, 'classes': [redcap values], 'accuracy': float, 'fold_accuracy': [float],
+			 'precision': [float per class], 'recall': [float per class], 'confusion': [[count]] (rows: redcap value, columns: predicted)}
+		"""
+		(classes,y) = self.get_classes(labels)
+		folds = max(min(folds,len(y)),2)
+		fold = self.get_folds(y,folds,stratified)
 
-			numwords = len(list(set(self.allwords)))
-			usewords = sorted(list(set(self.allwords)),key=self.allwords.count,reverse=True)[:int(numwords/1.5)]
-			try:
-				featuresset.append(({word: 1 if re.search(re.escape(word),art.text) else 0 for word in usewords},ml_data[str(pubmed[each_article]['record'])]))
-				#featuresset.append(({word: 1 if re.search(re.escape(word),art.xml_section('methods').text) else 0 for word in self.allwords},ml_data[str(pubmed[each_article]['record'])]=='1'))
-				#example of how Trainer could be applied to xml articles
-			except KeyError:
-				print("couldnt find article with record_id: {0}".format(each_article))
-			except TypeError:
-				print("couldnt find article with record_id: {}".format(each_article))
+		#word counts of each (fold, class), in one sparse product: rows of the indicator are (fold, class) pairs
+		indicator = sparse.csr_matrix((np.ones(len(y)),(fold * len(classes) + y,np.arange(len(y)))),shape=(folds * len(classes),len(y)))
+		counts = np.asarray((indicator @ matrix).todense()).reshape(folds,len(classes),-1)
+		class_counts = np.bincount(fold * len(classes) + y,minlength=folds * len(classes)).reshape(folds,len(classes))
+		(total,class_total) = (counts.sum(axis=0),class_counts.sum(axis=0))
+
+		jobs = [(matrix[fold == f],total - counts[f],class_total - class_counts[f],alpha) for f in range(folds)]
+		if (pool is not None):
+			predictions = list(pool.map(evaluate_fold,jobs))
+		else:
+			predictions = [evaluate_fold(job) for job in jobs]
+
+		predicted = np.zeros(len(y),dtype=int)
+		fold_accuracy = []
+		for (f,prediction) in enumerate(predictions):
+			predicted[fold == f] = prediction
+			fold_accuracy.append(float((prediction == y[fold == f]).mean()) if len(prediction) else 0.0)
+		confusion = np.zeros((len(classes),len(classes)),dtype=int)
+		np.add.at(confusion,(y,predicted),1)
+		with np.errstate(divide='ignore',invalid='ignore'):
+			precision = np.nan_to_num(confusion.diagonal() / confusion.sum(axis=0))
+			recall = np.nan_to_num(confusion.diagonal() / confusion.sum(axis=1))
+		return {
+			'articles':len(y),
+			'folds':folds,
+			'classes':classes,
+			'accuracy':float(confusion.trace() / max(len(y),1)),
+			'fold_accuracy':fold_accuracy,
+			'precision':precision.tolist(),
+			'recall':recall.tolist(),
+			'confusion':confusion.tolist(),
+			}
+
+	def get_model(self,redcap,matrix,labels,metrics,alpha=0.5):
+		"""
+		Train the model on every article
+		Args:
+			redcap 	-- redcap field the model predicts (string)
+			matrix 	-- document-term matrix of the articles (scipy.sparse matrix, see get_matrix)
+			labels 	-- redcap value of each row of matrix (list)
+			metrics -- cross-validation metrics of the model, saved with it (dictionary, see cross_validate)
+		Return: ModelArtifact
+		"""
+		(classes,y) = self.get_classes(labels)
+		indicator = sparse.csr_matrix((np.ones(len(y)),(y,np.arange(len(y)))),shape=(len(classes),len(y)))
+		class_counts = np.bincount(y,minlength=len(classes))
+		(bias,weights) = fit(np.asarray((indicator @ matrix).todense()),class_counts,alpha)
+		training = {
+			'trained':time.strftime("%Y-%m-%d %H:%M:%S"),
+			'articles':len(y),
+			'class_counts':class_counts.tolist(),
+			'alpha':alpha,
+			'cross_validation':metrics,
+			}
+		return ModelArtifact(redcap,self.vocabulary,classes,bias,weights,training=training,
+			data_dictionary=ModelArtifact.data_dictionary_version(DatabaseManager().get_metadata()))
+
+	def report(self,redcap,metrics):
+		print("{}: {}-fold cross-validation on {} articles".format(redcap,metrics['folds'],metrics['articles']))
+		print("\taccuracy: {:.3f} (fold accuracy: {:.3f} +/- {:.2f})".format(metrics['accuracy'],np.mean(metrics['fold_accuracy']),np.std(metrics['fold_accuracy'])))
+		print("\tclass \t\tprecision \trecall")
+		for (label,precision,recall) in zip(metrics['classes'],metrics['precision'],metrics['recall']):
+			print("\t{} \t\t{:.3g} \t\t{:.3g}".format(label,precision,recall))
+		print("\tconfusion matrix (rows: redcap value, columns: predicted)")
+		print("\t" + str(np.array(metrics['confusion'])).replace("\n","\n\t"))
 
-		acc = []
-		for i in range(300):
-			if (i%50 == 0):
-				print(i)
-			random.shuffle(featuresset)
-			trainset = featuresset[:-1]
-			testset = featuresset[-1:]
-			classifier = nltk.NaiveBayesClassifier.train(trainset)
-			acc.append(nltk.classify.accuracy(classifier,testset))
-			#classifier.show_most_informative_features(10)
-		print(sum(acc)/len(acc))
+	def train(self,redcap,ml_data,pool=None):
+		"""
+		Cross-validate and train the model of one field on the rows of the articles that have a value for it
+		Args:
+			redcap 	-- yesno redcap field (string)
+			ml_data -- {record_id: redcap value} (dictionary, see DatabaseManager.get_ml_data)
+		KeywordArgs: pool -- see cross_validate
+		Return: void, the metrics and model are kept in self.metrics[redcap] and self.models[redcap]
+		"""
+		keep = [i for (i,record) in enumerate(self.records) if record in ml_data]
+		if (len(keep) < len(self.records)):
+			print("{}: no redcap value for {} of {} articles".format(redcap,len(self.records) - len(keep),len(self.records)))
+		(matrix,labels) = (self.matrix[keep],[ml_data[self.records[i]] for i in keep])
+		if (len(set(labels)) < 2):
+			print("{}: cant train, articles need at least two different redcap values but have: {}".format(redcap,sorted(set(labels),key=str)))
+			return
+		self.metrics[redcap] = self.cross_validate(matrix,labels,self.folds,pool=pool)
+		self.report(redcap,self.metrics[redcap])
+		self.models[redcap] = self.get_model(redcap,matrix,labels,self.metrics[redcap])
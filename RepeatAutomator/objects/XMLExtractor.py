@@ -4,17 +4,19 @@
 import os, sys, re
 import requests
 from bs4 import BeautifulSoup
+from lxml import etree
 from DatabaseManager import DatabaseManager
 
 class XMLExtractor(DatabaseManager):
 	"""
-	Load xml from ncbi site,
-	Parse xml using BeautifulSoup
-	Extract data using BeautifulSoup
+	Load xml from ncbi's e-utilities (efetch),
+	Parse xml using BeautifulSoup (xml_load, xml_extract) or lxml (xml_extract_lxml)
+	Extract data using BeautifulSoup or precompiled lxml XPath expressions, both produce the same dictionary
 
 	Depends on imported modules:
 		requests		-- http://docs.python-requests.org/en/master/
 		beautiful soup	-- https://www.crummy.com/software/BeautifulSoup/bs4/doc/
+		lxml			-- http://lxml.de/
 		os				-- https://docs.python.org/3/library/os.html
 		sys				-- https://docs.python.org/3/library/sys.html
 		re				-- https://docs.python.org/3/library/re.html
@@ -23,18 +25,52 @@ class XMLExtractor(DatabaseManager):
 	See documentation for more information
 	"""
 
-	def xml_load(self,site):
+	#bibliographic fields: (name, BeautifulSoup.find arguments, XPath of the element)
+	#each field is the text of the first matching element in the article
+	fields = [
+		('journal','title','Title'),
+		('day','day','Day'),
+		('month','month','Month'),
+		('year','year','Year'),
+		('publisher','copyrightinformation','CopyrightInformation'),
+		('doi',("elocationid",{"eidtype":"doi"}),'ELocationID[@EIdType="doi"]'),
+		('article_title','articletitle','ArticleTitle'),
+		('last_name','lastname','LastName'),
+		('first_name','forename','ForeName'),
+		('institution','affiliation','Affiliation'),
+		]
+	xpaths = [(name,etree.XPath('string((//{})[1])'.format(path))) for (name,search,path) in fields]
+	has_article = etree.XPath('boolean(//PubmedArticle)')
+
+	def xml_download(self,site):
+		"""
+		Download the xml of an article, record error in the sql database if http request fails
+		Args: site -- url address where xml data lives (string)
+		Return: the response (string)
+				0 to indicate an error occurred
+		"""
+		try:
+			return requests.get(site,timeout=30).text
+		except Exception as e:
+			self.record_error(method='xml_load',object_caller='XMLExtractor',field=site,notes=str(e))
+			print("request to site: '{}'\nfailed. error information from requests:".format(site))
+			print("\t",e)
+			return 0
+
+	def xml_load(self,site,xml_text=None):
 		"""
 		Get xml data on an article, record error in the sql database if http request fails
 		Args: site -- url address where xml data lives (string)
+		KeywordArgs: xml_text -- response already downloaded from {site} (see PubmedFetcher), skips the http request (string)
+					 0 if the download already failed (and was recorded)
 		Return: bs4.BeautifulSoup object, BeautifulSoup of xml data
 				0 to indicate an error occurred
 
 		Example:
 		>>> xe = XMLExtractor()
-		>>> xe.xml_load("http://www.ncbi.nlm.nih.gov/pubmed/24433938?report=xml&format=text")
-		<?xml version="1.0" encoding="utf-8"?><!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Transitional//EN" "http://www.w3.org/TR/xhtml1/DTD/xhtml1-transitional.dtd">
-		<html><body><pre>
+		>>> xe.xml_load("https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi?db=pubmed&retmode=xml&id=24433938")
+		<?xml version="1.0" encoding="utf-8"?><!DOCTYPE PubmedArticleSet PUBLIC "-//NLM//DTD PubMedArticle, 1st January 2016//EN" "http://www.ncbi.nlm.nih.gov/corehtml/query/DTD/pubmed_160101.dtd">
+		<html><body><pubmedarticleset>
 		<pubmedarticle>
 		    <medlinecitation owner="NLM" status="MEDLINE">
 		        <pmid version="1">24433938</pmid>
@@ -52,16 +88,11 @@ class XMLExtractor(DatabaseManager):
 			 Invalid URL 'this is not a valid url': No schema supplied. Perhaps you meant http://this is not a valid url?
 		0
 		"""
-		xml_text = ''
-		try:
-			xml_text = requests.get(site).text
-		except Exception as e:
-			self.record_error(method='xml_load',object_caller='XMLExtractor',field=site,notes=str(e))
-			print("request to site: '{}'\nfailed. error information from requests:".format(site))
-			print("\t",e)
+		if (xml_text is None):
+			xml_text = self.xml_download(site)
+		if (not xml_text):
+			#download failed, user already notified
 			return 0
-		xml_text = re.sub(r'&lt;',"<",xml_text)
-		xml_text = re.sub(r'&gt;',">",xml_text)
 		data = self.parse_xml(xml_text)
 		if (not isinstance(data,BeautifulSoup)):
 			print("xml could not be interpretted for site: {}".format(site))
@@ -81,7 +112,7 @@ class XMLExtractor(DatabaseManager):
 		Example:
 		>>> xe = XMLExtractor()
 		>>> bs = xe.parse_xml("<PubmedArticle><MedlineCitation Owner="NLM" Status="MEDLINE"><PMID Version="1">24433938</PMID><DateCreated><Year>2014</Year> ...")
-		#from article: pubmed id: 24433938 -- see http://www.ncbi.nlm.nih.gov/pubmed/24433938?report=xml&format=text
+		#from article: pubmed id: 24433938 -- see https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi?db=pubmed&retmode=xml&id=24433938
 		>>> bs.articletitle
 		<ArticleTitle>Differences between intentional and non-intentional burns in India: implications for prevention.</ArticleTitle>
 		>>> bs.articletitle.text
@@ -120,7 +151,7 @@ class XMLExtractor(DatabaseManager):
 
 		Example:
 		>>> xe = XMLExtractor()
-		>>> bs = xe.xml_load("http://www.ncbi.nlm.nih.gov/pubmed/24433938?report=xml&format=text)
+		>>> bs = xe.xml_load("https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi?db=pubmed&retmode=xml&id=24433938")
 		>>> xe.xml_extract(bs)
 		{'article_doi': '10.1016/j.burns.2013.12.002',
 		 'article_title': 'Differences between intentional and non-intentional burns '
@@ -152,19 +183,54 @@ class XMLExtractor(DatabaseManager):
 			return {}
 
 		#call try_xml on each field so that if any field isnt found, extraction skips that field and continues
-		journalName = self.try_xml(bs,'title')
-		day = self.try_xml(bs,'day')
-		month = self.try_xml(bs,'month')
-		year = self.try_xml(bs,'year')
-		publisher = self.try_xml(bs,'copyrightinformation')
-		doi = self.try_xml(bs,("elocationid",{"eidtype":"doi"}))
-		articleTitle = self.try_xml(bs,'articletitle')
+		return self.xml_entry({name:self.try_xml(bs,search) for (name,search,path) in self.fields})
 
+	def xml_extract_lxml(self,xml,site=''):
+		"""
+		Extract redcap fields from pubmed xml with lxml
+		Faster and lighter than xml_load + xml_extract: the xml is parsed once into an lxml tree
+		and each field is read with a precompiled XPath expression instead of a BeautifulSoup search
+		Args: xml -- pubmed xml of an article, for example from PubmedFetcher (string or bytes)
+		KeywordArgs: site -- where the xml came from, for error messages (string)
+		Return: dictionary of redcap data, the same as xml_extract returns for the same article
+				empty dictionary if errors occur
+
+		Example:
+		>>> xe = XMLExtractor()
+		>>> xml = PubmedFetcher().fetch_all(['24433938'])['24433938']
+		>>> xe.xml_extract_lxml(xml)
+		{'article_doi': '10.1016/j.burns.2013.12.002',
+		 'article_title': 'Differences between intentional and non-intentional burns '
+		                  'in India: implications for prevention.',
+		 ...
+		"""
+		if (not xml):
+			#download failed, user already notified
+			return {}
+		try:
+			root = etree.fromstring(xml.encode('utf-8') if isinstance(xml,str) else xml)
+		except (etree.XMLSyntaxError,ValueError) as e:
+			print("xml could not be interpretted for site: {}".format(site))
+			self.record_error(method='parse_xml',object_caller='XMLExtractor',field=site,notes=str(e))
+			return {}
+		if (not self.has_article(root)):
+			e = "xml was not proper format (no 'pubmedarticle' tag found). likely, the wrong (but valid) website was entered"
+			print(e)
+			self.record_error(method='parse_xml',object_caller='XMLExtractor',field=site,notes=e)
+			return {}
+		return self.xml_entry({name:xpath(root) for (name,xpath) in self.xpaths})
+
+	def xml_entry(self,fields):
+		"""
+		Build the redcap entry from the bibliographic fields of an article (shared by xml_extract and xml_extract_lxml)
+		Args: fields -- dictionary of format: {name: text} (see XMLExtractor.fields)
+		Return: dictionary of redcap data
+		"""
 		#redcap only allows alpha characters for first and last name. sub out some common invalid characters
-		lastName = re.sub('[\W_\s]','',self.try_xml(bs,"lastname"))
-		firstName = re.sub('[\W_\s]','',self.try_xml(bs,'forename'))
+		lastName = re.sub('[\W_\s]','',fields['last_name'])
+		firstName = re.sub('[\W_\s]','',fields['first_name'])
 
-		institution = self.try_xml(bs,'affiliation')
+		institution = fields['institution']
 		if ('@' in institution):
 			search = re.search(r'\s((\w|\.)+@.+)',institution);
 			email = search.group(1);
@@ -181,13 +247,13 @@ class XMLExtractor(DatabaseManager):
 		#see executer or ArticleExtractor for more information
 
 		return ({
-			'article_doi':doi,
-			'journal_publication':journalName,
-			'publication_date':"{0}-{1}-{2}".format(year,month,day),
+			'article_doi':fields['doi'],
+			'journal_publication':fields['journal'],
+			'publication_date':"{0}-{1}-{2}".format(fields['year'],fields['month'],fields['day']),
 			'author_fn':firstName,
 			'author_ln':lastName,
 			'author_email':email,
-			'article_title':articleTitle,
+			'article_title':fields['article_title'],
 			})
 
 	def try_xml(self, bs, search):
@@ -195,7 +261,7 @@ class XMLExtractor(DatabaseManager):
 		Handle errors that occur when tags arent found in BeautifulSoup so script doesnt Force-quit when a field isnt found
 		Args:
 			bs 		-- xml data from ncbi site (bs4.BeautifulSoup object)
-			search 	-- string or tuple, argument in BeautifulSoup.find method call
+			search 	-- string, or tuple of arguments, for the BeautifulSoup.find method call
 		Return: data in form of string
 				empty string if nothing found
 		Called by xml_extractor
@@ -212,6 +278,8 @@ class XMLExtractor(DatabaseManager):
 		10.1016/j.annemergmed.2013.08.019
 		"""
 		try:
+			if (isinstance(search,tuple)):
+				return bs.find(*search).text
 			return bs.find(search).text
 		except AttributeError as e:
 			#field not found
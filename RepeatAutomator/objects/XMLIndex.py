@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os, re, json, mmap
+
+class XMLIndex(object):
+	"""
+	Byte offset index for a pubmed central bulk xml file (in the format of 'pmc_result.xml')
+	Records where each <article> starts and ends along with all of its article-id values (pmid, pmc, doi, publisher-id),
+	so ArticleManager.get_articles_indexed can seek straight to the requested articles instead of reading the whole file
+
+	The index is saved next to the xml file as {file}.idx (json) and rebuilt automatically when the xml file changes
+
+	Depends on imported modules:
+		os				-- https://docs.python.org/3/library/os.html
+		re				-- https://docs.python.org/3/library/re.html
+		json 			-- https://docs.python.org/3.4/library/json.html
+		mmap			-- https://docs.python.org/3/library/mmap.html
+	See documentation for more information
+	"""
+
+	version = 1
+	article_tag = re.compile(rb'<article[\s>]|</article>')
+	article_id = re.compile(rb'<article-id\s[^>]*?pub-id-type=["\']([^"\']+)["\'][^>]*>\s*([^<]*?)\s*</article-id>')
+
+	def __init__(self,file):
+		"""
+		Load the index for {file}, building (and saving) it if it doesnt exist or is out of date
+		Args: file -- location of the xml file (string)
+
+		Example:
+		>>> index = XMLIndex("/Users/christian/Desktop/cbmi/reproduce/python/articles/sub_pmc_result.xml")
+		>>> index.find("pmid","23449283")
+		(1024, 187311)
+		>>> index.find("doi","not a doi")
+		"""
+		self.file = file
+		self.path = file + ".idx"
+		self.articles = []		#list of [start, end, {identifier: article_id}]
+		if (not self.load()):
+			self.build()
+			self.save()
+		self.lookup = {}
+		for (start,end,ids) in self.articles:
+			for (identifier,article_id) in ids.items():
+				self.lookup.setdefault((identifier,article_id),(start,end))
+
+	def signature(self):
+		stat = os.stat(self.file)
+		return [self.version,stat.st_size,stat.st_mtime_ns]
+
+	def load(self):
+		"""
+		Read the saved index
+		Return: True if a saved index for the current version of the xml file was loaded, otherwise False
+		"""
+		try:
+			with open(self.path,'r') as f:
+				saved = json.load(f)
+		except (OSError,ValueError):
+			return False
+		if (saved.get('signature') != self.signature()):
+			#xml file changed since the index was built
+			return False
+		self.articles = saved['articles']
+		return True
+
+	def save(self):
+		try:
+			with open(self.path,'w') as f:
+				json.dump({'signature':self.signature(),'articles':self.articles},f)
+		except OSError as e:
+			#index still works for this run, it just has to be rebuilt next time
+			print("couldnt save xml index: {}\n\t{}".format(self.path,e))
+
+	def build(self):
+		"""
+		Scan the xml file for article boundaries and ids
+		The file is memory-mapped and matched with regular expressions, so it is never parsed or loaded whole
+		Return: void
+		"""
+		print("indexing xml file: {}".format(self.file))
+		self.articles = []
+		with open(self.file,'rb') as f:
+			if (os.fstat(f.fileno()).st_size == 0):
+				return
+			with mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ) as mm:
+				depth = start = 0
+				for tag in self.article_tag.finditer(mm):
+					if (tag.group().startswith(b'</')):
+						depth -= 1
+						if (depth == 0):
+							self.articles.append([start,tag.end(),self.get_ids(mm[start:tag.end()])])
+					else:
+						if (depth == 0):
+							start = tag.start()
+						depth += 1
+
+	def get_ids(self,article):
+		"""
+		Get the ids of an article
+		Args: article -- raw xml of one article (bytes)
+		Return: dictionary of format: {identifier: article_id} (the first id of each type, from the article's front matter)
+		"""
+		front = article.find(b'</front>')
+		if (front != -1):
+			article = article[:front]		#dont pick up ids of sub-articles or responses
+		ids = {}
+		for (identifier,article_id) in self.article_id.findall(article):
+			ids.setdefault(identifier.decode('utf-8','replace'),article_id.decode('utf-8','replace'))
+		return ids
+
+	def find(self,identifier,article_id):
+		"""
+		Locate an article
+		Args:
+			identifier 	-- type of article_id (doi, pmc, pmid, publisher-id) (string)
+			article_id 	-- the article's id (string)
+		Return: (start,end) byte offsets of the article in the xml file, or None if the article isnt in the file
+		"""
+		return self.lookup.get((identifier,str(article_id).strip()))